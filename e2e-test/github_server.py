@@ -0,0 +1,312 @@
+"""
+Local stand-in for the GitHub API endpoints used by the setup script, so
+provisioning & rollback can be tested & benchmarked without github.com
+
+Run it from the root directory & point the script at it, e.g.
+    python3 e2e-test/github_server.py --port=8080 --latency=0.05
+    python3 src/run.py --github-api=http://127.0.0.1:8080
+"""
+
+# Native Modules
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+USER_KEYS_PATTERN = re.compile(r'^/users/(?P<username>[^/]+)/keys$')
+KEY_PATTERN = re.compile(r'^/user/keys/(?P<key_id>\d+)$')
+
+
+class GithubState:
+    """
+    In-memory state of the stand-in server, shared by every request thread
+    """
+
+    def __init__(self, options: argparse.Namespace):
+        self.options = options
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.next_id = 1
+        self.version = 0
+        self.budgets = {}
+
+        for index in range(options.seed_keys):
+            key_data = base64.b64encode(os.urandom(51)).decode('utf-8')
+            self.add_key(f'seed-key-{index}', f'ssh-ed25519 {key_data}')
+
+    def add_key(self, title: str, key: str) -> dict:
+        """
+        Stores a new public key & bumps the version used for ETags
+        """
+        entry = {'id': self.next_id, 'key': key, 'title': title}
+        self.keys[self.next_id] = entry
+        self.next_id += 1
+        self.version += 1
+        return entry
+
+    def consume_budget(self, token: str) -> tuple:
+        """
+        Consumes a request from the token's rate limit budget, returning the
+        limit, remaining requests & reset time of the current window
+        """
+        now = int(time.time())
+        limit = self.options.rate_limit
+
+        with self.lock:
+            remaining, reset = self.budgets.get(token, (limit, 0))
+            if reset <= now:
+                remaining, reset = limit, now + self.options.rate_window
+            if remaining > 0:
+                remaining -= 1
+                self.budgets[token] = (remaining, reset)
+                return limit, remaining, reset, True
+            return limit, 0, reset, False
+
+
+class GithubRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the GitHub API endpoints for public keys & the GraphQL probe
+    """
+
+    server_version = 'GithubStandIn/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self) -> GithubState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if not self.state.options.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, body, headers: dict = None):
+        """
+        Sends the JSON body along with the rate limit & additional headers
+        """
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+
+        self.send_response(status)
+        if status >= 400:
+            # The request body may be left unread, so it can't be reused
+            self.close_connection = True
+            self.send_header('Connection', 'close')
+        for key, value in {**self.rate_limit_headers,
+                           **(headers or {})}.items():
+            self.send_header(key, str(value))
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        """
+        Reads the JSON body of the request
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def handle_common(self, conditional: bool = False) -> bool:
+        """
+        Simulates latency, injected errors & rate limiting, returning whether
+        the request should proceed. Conditional requests don't consume the
+        rate limit budget until they're known to be modified
+        """
+        options = self.state.options
+        self.rate_limit_headers = {}
+
+        if options.latency:
+            time.sleep(options.latency)
+
+        if random.random() < options.error_rate:
+            self.send_json(random.choice(options.error_statuses),
+                           {'message': 'Injected error'})
+            return False
+
+        token = self.headers.get('Authorization', self.client_address[0])
+        if conditional:
+            self.rate_limit_token = token
+            return True
+
+        return self.apply_rate_limit(token)
+
+    def apply_rate_limit(self, token: str) -> bool:
+        """
+        Consumes the token's budget, responding with 403 once it's exhausted
+        """
+        limit, remaining, reset, allowed = self.state.consume_budget(token)
+        self.rate_limit_headers = {
+            'X-RateLimit-Limit': limit,
+            'X-RateLimit-Remaining': remaining,
+            'X-RateLimit-Reset': reset
+        }
+
+        if not allowed:
+            self.send_json(403, {'message': 'API rate limit exceeded'})
+        return allowed
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        match = USER_KEYS_PATTERN.match(url.path)
+
+        if url.path != '/user/keys' and not match:
+            if self.handle_common():
+                self.send_json(404, {'message': 'Not Found'})
+            return
+
+        if not self.handle_common(conditional=True):
+            return
+
+        query = parse_qs(url.query)
+        per_page = min(int(query.get('per_page', ['30'])[0]), 100)
+        page = max(int(query.get('page', ['1'])[0]), 1)
+
+        with self.state.lock:
+            keys = sorted(self.state.keys.values(), key=lambda x: x['id'])
+            version = self.state.version
+
+        etag = hashlib.sha1(f'{version}:{per_page}:{page}'.encode('utf-8'))
+        etag = f'"{etag.hexdigest()}"'
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_json(304, None, {'ETag': etag})
+            return
+
+        if not self.apply_rate_limit(self.rate_limit_token):
+            return
+
+        start = (page - 1) * per_page
+        body = [{'id': x['id'], 'key': x['key']}
+                for x in keys[start:start + per_page]]
+        headers = {'ETag': etag}
+
+        if start + per_page < len(keys):
+            host = self.headers.get('Host')
+            headers['Link'] = f'<http://{host}{url.path}?per_page=' \
+                              f'{per_page}&page={page + 1}>; rel="next"'
+
+        self.send_json(200, body, headers)
+
+    def do_POST(self):
+        if not self.handle_common():
+            return
+
+        if self.path == '/graphql':
+            self.handle_graphql()
+            return
+
+        if self.path != '/user/keys':
+            self.send_json(404, {'message': 'Not Found'})
+            return
+
+        payload = self.read_json()
+
+        with self.state.lock:
+            if any(x['key'] == payload.get('key')
+                   for x in self.state.keys.values()):
+                self.send_json(422, {'message': 'key is already in use'})
+                return
+            entry = self.state.add_key(payload.get('title'),
+                                       payload.get('key'))
+
+        self.send_json(201, entry)
+
+    def do_DELETE(self):
+        if not self.handle_common():
+            return
+
+        match = KEY_PATTERN.match(self.path)
+
+        with self.state.lock:
+            if not match or \
+                    not self.state.keys.pop(int(match['key_id']), None):
+                self.send_json(404, {'message': 'Not Found'})
+                return
+            self.state.version += 1
+
+        self.send_json(204, None)
+
+    def handle_graphql(self):
+        """
+        Answers the account probe query for the repositories & public keys
+        """
+        variables = self.read_json().get('variables') or {}
+        offset = int(variables.get('cursor') or 0)
+
+        with self.state.lock:
+            keys = sorted(self.state.keys.values(), key=lambda x: x['id'])
+
+        page = keys[offset:offset + 100]
+        user = {
+            'repository': None,
+            'publicKeys': {
+                'nodes': [{'key': x['key']} for x in page],
+                'pageInfo': {
+                    'hasNextPage': offset + 100 < len(keys),
+                    'endCursor': str(offset + len(page))
+                }
+            }
+        }
+        body = {'data': {'user': user}}
+
+        if 'dotfiles' in self.state.options.repos:
+            user['repository'] = {'defaultBranchRef': {
+                'name': 'master', 'target': {'oid': '0' * 40}}}
+        else:
+            body['errors'] = [{'type': 'NOT_FOUND',
+                               'message': 'Could not resolve to a '
+                                          'Repository'}]
+
+        self.send_json(200, body, {
+            'X-OAuth-Scopes': ', '.join(self.state.options.scopes)})
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parses the options of the stand-in server
+    """
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the GitHub API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='probability of responding with an error')
+    parser.add_argument('--error-statuses', type=int, nargs='+',
+                        default=[500, 502, 503],
+                        help='statuses of the injected errors')
+    parser.add_argument('--rate-limit', type=int, default=5000,
+                        help='requests allowed per token within a window')
+    parser.add_argument('--rate-window', type=int, default=3600,
+                        help='seconds until the rate limit resets')
+    parser.add_argument('--seed-keys', type=int, default=0,
+                        help='number of public keys to start with')
+    parser.add_argument('--repos', nargs='*', default=[],
+                        help='repositories the user owns, e.g. dotfiles')
+    parser.add_argument('--scopes', nargs='*',
+                        default=['repo', 'admin:public_key'],
+                        help='scopes of the token reported to the client')
+    parser.add_argument('--quiet', action='store_true')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    OPTIONS = parse_arguments()
+
+    SERVER = ThreadingHTTPServer((OPTIONS.host, OPTIONS.port),
+                                 GithubRequestHandler)
+    SERVER.state = GithubState(OPTIONS)
+
+    print(f'Serving the GitHub API stand-in on '
+          f'http://{OPTIONS.host}:{OPTIONS.port}')
+    try:
+        SERVER.serve_forever()
+    except KeyboardInterrupt:
+        SERVER.server_close()
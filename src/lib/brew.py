@@ -3,133 +3,470 @@ Module delegated to handling brew logic
 """
 
 # Native Modules
+import collections
+import json
 import logging
-from itertools import tee
+import os
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from subprocess import DEVNULL, PIPE, Popen, call, check_output
+from typing import Dict, List, Set, Tuple
 
 # Custom Modules
 from singletons.setup import SetupSingleton
+from utils import fs
+from utils.cache import MetadataCache
 from utils.general import (consume, format_ansi_string, format_success_message,
-                           partition)
+                           partition, topological_waves)
+from utils.process import run_streamed
 from utils.unicode import ForeGroundColor
 
+PackageInfo = collections.namedtuple('PackageInfo', ['name', 'version',
+                                                     'dependencies'])
+
 SETUP = SetupSingleton.get_instance()
 LOGGER = logging.getLogger()
 
+QUOTED_PATTERN = re.compile(r'["\'\u201c]([^"\'\u201d]+)["\'\u201d]')
+
+CACHE_MISS = object()
+REGISTRY_KINDS = ('formulae', 'casks')
+
+LOCK_PATTERN = re.compile(r'already locked|another active homebrew process',
+                          re.IGNORECASE)
+LOCK_RETRIES = 5
+LOCK_BACKOFF = 3
+
 
-def install_all_brew_packages():
+def parse_package_info(data: dict, cask: bool) -> PackageInfo:
     """
-    Downloads & installs every package configured
+    Parses a formula or cask entry from 'brew info --json=v2' into the
+    metadata required for installation
     """
-    def process_package(package: str):
-        """
-        Installs the package if possible & logs correspondingly
-        """
-        command = f'brew info {package}'
-        package_found = call(command.split(), stdout=DEVNULL) == 0
+    if cask:
+        depends_on = data.get('depends_on') or {}
+        dependencies = [*depends_on.get('formula', []),
+                        *depends_on.get('cask', [])]
+        return PackageInfo(data['token'], data.get('version'), dependencies)
+
+    version = (data.get('versions') or {}).get('stable')
+    return PackageInfo(data['name'], version, data.get('dependencies', []))
 
-        if not package_found:
-            LOGGER.warning(format_ansi_string(f'This package does not exist '
-                                              f'in registry - {package}',
-                                              ForeGroundColor.YELLOW))
-            return
 
-        command = f'brew install {package}'
-        with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
+def query_registry_index(packages: List[str], cask: bool = False) \
+        -> Dict[str, PackageInfo]:
+    """
+    Resolves every package passed in against the registry in a single
+    'brew info --json=v2' invocation & indexes the metadata by name, full name
+    & aliases. Packages missing from the registry are excluded from the query
+    & it's retried with the remaining packages
+    """
+    kind = '--cask' if cask else '--formula'
+    index = {}
+    remaining = list(packages)
+
+    while remaining:
+        command = ['brew', 'info', '--json=v2', kind, *remaining]
+        with Popen(command, stdout=PIPE, stderr=PIPE) as process:
             out, err = process.communicate()
-            installed_successfully = process.returncode == 0
-
-            if err and not installed_successfully:
-                LOGGER.warning(err.decode('utf-8'))
-                LOGGER.warning(format_ansi_string(f'{package} - issue during '
-                                                  f'installation',
-                                                  ForeGroundColor.YELLOW))
-            else:
-                LOGGER.debug(out.decode('utf-8'))
-                LOGGER.info(format_ansi_string(f'{package} - successfully '
-                                               f'installed',
-                                               ForeGroundColor.GREEN))
-
-    command = 'brew list --formula'
-    output = check_output(command.split())
-    brew_list = output.decode('utf-8').strip().split('\n')
+            resolved = process.returncode == 0
 
-    with open(SETUP.files.brew) as text_file:
-        configured_packages = map(lambda x: x.strip(), text_file.readlines())
+        if resolved:
+            data = json.loads(out.decode('utf-8'))
+            for entry in data['casks' if cask else 'formulae']:
+                info = parse_package_info(entry, cask)
+                names = [entry.get('full_token' if cask else 'full_name'),
+                         *entry.get('aliases', []), info.name]
+                index.update({x: info for x in names if x})
+            break
 
-        installed_packages, uninstalled_packages = partition(
-            lambda x: x in brew_list, configured_packages)
+        missing = set(QUOTED_PATTERN.findall(err.decode('utf-8')))
+        missing = missing.intersection(remaining)
+
+        if not missing:
+            LOGGER.warning(err.decode('utf-8'))
+            LOGGER.warning(format_ansi_string('Failed to query the registry '
+                                              'in a single invocation, '
+                                              'validating packages '
+                                              'individually',
+                                              ForeGroundColor.YELLOW))
+            for package in remaining:
+                command = ['brew', 'info', kind, package]
+                if call(command, stdout=DEVNULL, stderr=DEVNULL) == 0:
+                    index[package] = PackageInfo(package, None, [])
+            break
+
+        remaining = [x for x in remaining if x not in missing]
+    return index
 
-        consume(map(lambda x: LOGGER.info(
-            format_ansi_string(f'{x} - already installed',
-                               ForeGroundColor.LIGHT_GREEN)), installed_packages))
 
-        uninstalled_packages, uninstalled_packages_copy = tee(
-            uninstalled_packages)
+def registry_cache_path(kind: str) -> str:
+    """
+    Returns the path of the persistent metadata cache of the registry kind
+    """
+    return f'{SETUP.directories.cache}/brew/{kind}.json'
 
-        if not next(uninstalled_packages_copy, None):
-            LOGGER.info(format_success_message(
-                'No available brew packages to install\n'))
+
+def retrieve_registry_index(packages: List[str], cask: bool = False) \
+        -> Dict[str, PackageInfo]:
+    """
+    Resolves every package passed in from the persistent metadata cache &
+    only queries the registry for the packages that are missing or expired.
+    Packages missing from the registry aren't cached, so they're queried
+    again once they're published
+    """
+    kind = 'casks' if cask else 'formulae'
+    cache = MetadataCache(registry_cache_path(kind),
+                          SETUP.settings.brew_cache_ttl,
+                          SETUP.settings.brew_cache_size)
+    index = {}
+    stale_packages = []
+
+    for package in packages:
+        entry = cache.get(package, CACHE_MISS)
+
+        if entry is CACHE_MISS or not entry:
+            stale_packages.append(package)
         else:
-            consume(map(lambda x: process_package(x), uninstalled_packages))
-            LOGGER.info(format_success_message(
-                'All configured brew packages are now installed\n'))
+            index[package] = PackageInfo(**entry)
+
+    LOGGER.debug(f'Brew {kind} resolved from cache - {len(index)}, '
+                 f'refreshing - {len(stale_packages)}')
+
+    if stale_packages:
+        queried_index = query_registry_index(stale_packages, cask)
+        for package in stale_packages:
+            if package in queried_index:
+                cache.put(package, queried_index[package]._asdict())
+        index.update(queried_index)
 
+    cache.save()
 
-def install_all_cask_packages():
+    index.update({x.name: x for x in list(index.values())})
+    return index
+
+
+def resolve_dependency_closure(index: Dict[str, PackageInfo]) \
+        -> Dict[str, PackageInfo]:
+    """
+    Extends the formula registry index with every dependency reachable from
+    the formulae in it, querying the unknown dependencies in one batch per
+    level, so the install waves are ordered through dependencies that aren't
+    configured themselves
+    """
+    queried = set(index)
+
+    while True:
+        unknown = {x for info in list(index.values())
+                   for x in info.dependencies if x not in queried}
+        if not unknown:
+            return index
+
+        queried.update(unknown)
+        index.update(retrieve_registry_index(sorted(unknown)))
+
+
+def retrieve_dependency_graph(packages: List[str],
+                              index: Dict[str, PackageInfo]) \
+        -> Dict[str, Set[str]]:
     """
-    Downloads & installs every package configured
+    Maps each package to the packages passed in that it depends on, resolved
+    transitively through the dependencies held in the registry index, which
+    holds every reachable dependency once resolve_dependency_closure extended
+    it. A dependency missing from the registry ends the walk
     """
-    def process_package(package: str):
+    def dependencies_of(package: str) -> Set[str]:
         """
-        Installs the package if possible & logs correspondingly
+        Collects every indexed dependency reachable from the package
         """
-        command = f'brew cask info {package}'
-        package_found = call(command.split(), stdout=DEVNULL) == 0
+        seen = set()
+        pending = list(index[package].dependencies)
 
-        if not package_found:
-            LOGGER.warning(format_ansi_string(f'This package does not exist '
-                                              f'in registry - {package}',
-                                              ForeGroundColor.YELLOW))
-            return
+        while pending:
+            dependency = pending.pop()
+            if dependency in seen or dependency not in index:
+                continue
+            seen.add(dependency)
+            pending.extend(index[dependency].dependencies)
+        return seen
 
-        command = f'brew cask install {package}'
-        with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-            out, err = process.communicate()
-            installed_successfully = process.returncode == 0
-
-            if err and not installed_successfully:
-                LOGGER.warning(err.decode('utf-8'))
-                LOGGER.warning(format_ansi_string(f'{package} - issue during '
-                                                  f'installation',
-                                                  ForeGroundColor.YELLOW))
-            else:
-                LOGGER.debug(out.decode('utf-8'))
-                LOGGER.info(format_ansi_string(f'{package} - successfully '
-                                               f'installed',
-                                               ForeGroundColor.GREEN))
-
-    command = 'brew list --cask'
+    canonical_names = {index[x].name: x for x in packages}
+
+    return {x: {canonical_names[y] for y in dependencies_of(x)
+                if y in canonical_names} - {x} for x in packages}
+
+
+def run_with_lock_retry(command: List[str], package: str) -> tuple:
+    """
+    Runs the brew command for the package with its output streamed into the
+    package's log file. Homebrew locks every formula it downloads or pours, so
+    a command racing another one over a shared dependency backs off & retries
+    once the lock is released
+    """
+    log_path = f'{SETUP.directories.logs}/brew/{package}.log'
+
+    for attempt in range(1, LOCK_RETRIES + 1):
+        returncode, out, err = run_streamed(command, log_path)
+        succeeded = returncode == 0
+
+        if succeeded or not LOCK_PATTERN.search(err):
+            break
+
+        LOGGER.debug(f'{package} - waiting on Homebrew lock (attempt '
+                     f'{attempt})')
+        time.sleep(LOCK_BACKOFF * attempt)
+    return succeeded, out, err
+
+
+def retrieve_uninstalled_packages(filename: str, cask: bool = False) \
+        -> Tuple[List[str], Dict[str, PackageInfo]]:
+    """
+    Reads the configured packages & returns the ones that aren't installed
+    yet but exist in the registry, along with the registry index
+    """
+    command = f'brew list {"--cask" if cask else "--formula"}'
     output = check_output(command.split())
-    cask_list = output.decode('utf-8').strip().split('\n')
+    brew_list = output.decode('utf-8').strip().split('\n')
 
-    with open(SETUP.files.cask) as text_file:
+    with open(filename) as text_file:
         configured_packages = map(lambda x: x.strip(), text_file.readlines())
 
         installed_packages, uninstalled_packages = partition(
-            lambda x: x in cask_list, configured_packages)
+            lambda x: x in brew_list, configured_packages)
 
-        consume(map(lambda x: LOGGER.info(
-            format_ansi_string(f'{x} - already installed',
-                               ForeGroundColor.LIGHT_GREEN)), installed_packages))
+    consume(map(lambda x: LOGGER.info(
+        format_ansi_string(f'{x} - already installed',
+                           ForeGroundColor.LIGHT_GREEN)), installed_packages))
 
-        uninstalled_packages, uninstalled_packages_copy = tee(
-            uninstalled_packages)
+    index = retrieve_registry_index(uninstalled_packages, cask) \
+        if uninstalled_packages else {}
+    if not cask:
+        index = resolve_dependency_closure(index)
 
-        if not next(uninstalled_packages_copy, None):
-            LOGGER.info(format_success_message(
-                'No available cask packages to install'))
+    for package in uninstalled_packages:
+        if package not in index:
+            LOGGER.warning(format_ansi_string(f'This package does not exist '
+                                              f'in registry - {package}',
+                                              ForeGroundColor.YELLOW))
         else:
-            consume(map(lambda x: process_package(x), uninstalled_packages))
-            LOGGER.info(format_success_message(
-                'All configured brew cask packages are now installed'))
+            LOGGER.debug(f'{package} - resolved to version '
+                         f'{index[package].version}')
+
+    return [x for x in uninstalled_packages if x in index], index
+
+
+def fetch_package(package: str, cask: bool = False) -> bool:
+    """
+    Downloads the package & its dependencies into the Homebrew cache ahead of
+    installation, a failed download is left for the installation to retry
+    """
+    command = f'brew cask fetch {package}' if cask \
+        else f'brew fetch --deps {package}'
+    fetched, out, err = run_with_lock_retry(command.split(), package)
+
+    if not fetched:
+        LOGGER.debug(err)
+        LOGGER.debug(f'{package} - failed to prefetch')
+    else:
+        LOGGER.debug(out)
+        LOGGER.debug(f'{package} - prefetched')
+    return fetched
+
+
+def install_package(package: str, cask: bool = False,
+                    download: Future = None):
+    """
+    Installs the package once its download has finished (if any) & logs
+    correspondingly
+    """
+    if download:
+        download.result()
+
+    command = f'brew cask install {package}' if cask \
+        else f'brew install {package}'
+    installed_successfully, out, err = run_with_lock_retry(command.split(),
+                                                           package)
+
+    if err and not installed_successfully:
+        LOGGER.warning(err)
+        LOGGER.warning(format_ansi_string(f'{package} - issue during '
+                                          f'installation',
+                                          ForeGroundColor.YELLOW))
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string(f'{package} - successfully installed',
+                                       ForeGroundColor.GREEN))
+
+
+def retrieve_installed_packages(packages: List[str],
+                                index: Dict[str, PackageInfo],
+                                cask: bool = False) -> Set[str]:
+    """
+    Returns which of the packages passed in are installed, querying all of
+    them in a single invocation
+    """
+    command = ['brew', 'list', '--cask' if cask else '--formula',
+               '--versions', *packages]
+    with Popen(command, stdout=PIPE, stderr=DEVNULL) as process:
+        out, _ = process.communicate()
+
+    installed = {x.split()[0] for x in out.decode('utf-8').split('\n') if x}
+    return {x for x in packages
+            if x in installed or index[x].name in installed}
+
+
+def install_package_group(packages: List[str], index: Dict[str, PackageInfo],
+                          downloads: Dict[str, Future], cask: bool = False):
+    """
+    Installs the packages in a single brew invocation once all their downloads
+    have finished, then parses back the result of each package & logs
+    correspondingly
+    """
+    consume(map(lambda x: downloads[x].result(),
+                filter(lambda x: x in downloads, packages)))
+
+    command = ['brew', 'cask', 'install', *packages] if cask \
+        else ['brew', 'install', *packages]
+    group = f'{packages[0]}+{len(packages) - 1}' if len(packages) > 1 \
+        else packages[0]
+    _, out, err = run_with_lock_retry(command, group)
+
+    LOGGER.debug(out)
+
+    installed_packages = retrieve_installed_packages(packages, index, cask)
+    error_lines = err.split('\n')
+
+    for package in packages:
+        if package in installed_packages:
+            LOGGER.info(format_ansi_string(f'{package} - successfully '
+                                           f'installed',
+                                           ForeGroundColor.GREEN))
+            continue
+
+        pattern = re.compile(rf'\b{re.escape(package)}\b')
+        package_errors = '\n'.join(x for x in error_lines
+                                   if pattern.search(x))
+
+        if package_errors or err:
+            LOGGER.warning(package_errors or err)
+        LOGGER.warning(format_ansi_string(f'{package} - issue during '
+                                          f'installation',
+                                          ForeGroundColor.YELLOW))
+
+
+def update_homebrew():
+    """
+    Updates Homebrew once explicitly & disables the auto-update that every
+    subsequent brew command would otherwise run. The cached registry metadata
+    is discarded after a successful update as the registry changed with it
+    """
+    command = 'brew update'
+    returncode, out, err = run_streamed(
+        command.split(), f'{SETUP.directories.logs}/brew/update.log')
+    updated = returncode == 0
+
+    if not updated:
+        LOGGER.warning(err)
+        LOGGER.warning(format_ansi_string('Failed to update Homebrew, '
+                                          'installing from the current '
+                                          'registry', ForeGroundColor.YELLOW))
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string('Homebrew has successfully been '
+                                       'updated', ForeGroundColor.GREEN))
+
+        for kind in REGISTRY_KINDS:
+            fs.remove(registry_cache_path(kind))
+
+    os.environ['HOMEBREW_NO_AUTO_UPDATE'] = '1'
+
+
+def install_brew_packages(packages: List[str], index: Dict[str, PackageInfo],
+                          downloads: Dict[str, Future]):
+    """
+    Installs the packages concurrently in waves of the dependency graph, so a
+    package is only installed once its configured dependencies are
+    """
+    if not packages:
+        LOGGER.info(format_success_message(
+            'No available brew packages to install'))
+        return
+
+    waves = topological_waves(retrieve_dependency_graph(packages, index))
+
+    LOGGER.debug(f'Brew installation waves - {waves}')
+
+    if SETUP.settings.brew_batch:
+        consume(map(lambda x: install_package_group(x, index, downloads),
+                    waves))
+    else:
+        with ThreadPoolExecutor(SETUP.settings.brew_workers) as executor:
+            for wave in waves:
+                consume(executor.map(
+                    lambda x: install_package(x, download=downloads.get(x)),
+                    wave))
+
+    LOGGER.info(format_success_message(
+        'All configured brew packages are now installed'))
+
+
+def install_cask_packages(packages: List[str], index: Dict[str, PackageInfo],
+                          downloads: Dict[str, Future]):
+    """
+    Installs the packages one at a time in the order their downloads finish,
+    as cask installations may prompt for the user's password. In batch mode
+    they're all installed in a single invocation instead
+    """
+    if not packages:
+        LOGGER.info(format_success_message(
+            'No available cask packages to install'))
+        return
+
+    if SETUP.settings.brew_batch:
+        install_package_group(packages, index, downloads, cask=True)
+        LOGGER.info(format_success_message(
+            'All configured brew cask packages are now installed'))
+        return
+
+    finished_downloads = as_completed(downloads.values())
+    packages_by_download = {v: k for k, v in downloads.items()}
+
+    consume(map(lambda x: install_package(packages_by_download[x], cask=True,
+                                          download=x), finished_downloads))
+
+    LOGGER.info(format_success_message(
+        'All configured brew cask packages are now installed'))
+
+
+def install_all_packages():
+    """
+    Downloads & installs every brew & cask package configured as a pipeline.
+    Every artifact is downloaded concurrently into the Homebrew cache while
+    packages are installed as soon as their own download has finished, so
+    network transfers overlap with the local installations. In batch mode,
+    Homebrew is updated once upfront & packages are installed in groups
+    """
+    if SETUP.settings.brew_batch:
+        update_homebrew()
+
+    formulae, index = retrieve_uninstalled_packages(SETUP.files.brew)
+    casks, cask_index = retrieve_uninstalled_packages(SETUP.files.cask,
+                                                      cask=True)
+
+    waves = topological_waves(retrieve_dependency_graph(formulae, index))
+
+    with ThreadPoolExecutor(SETUP.settings.brew_workers) as downloader, \
+            ThreadPoolExecutor(2) as installer:
+        formula_downloads = {x: downloader.submit(fetch_package, x)
+                             for wave in waves for x in wave}
+        cask_downloads = {x: downloader.submit(fetch_package, x, True)
+                          for x in casks}
+
+        stages = [
+            installer.submit(install_brew_packages, formulae, index,
+                             formula_downloads),
+            installer.submit(install_cask_packages, casks, cask_index,
+                             cask_downloads)
+        ]
+        consume(map(lambda x: x.result(), stages))
@@ -3,30 +3,49 @@ Module delegated to handling logic related to dotfiles
 """
 
 # Native Modules
+import json
 import logging
+import os
 import sys
-from subprocess import DEVNULL, PIPE, Popen, call
+from subprocess import DEVNULL, call
+from typing import Dict
 
 from singletons.github import GithubSingleton
 # Custom Modules
 from singletons.setup import SetupSingleton
+from utils import fs
 from utils.general import format_ansi_string, format_success_message
+from utils.process import ProcessResult, run_streamed
 from utils.unicode import ForeGroundColor
 
 SETUP = SetupSingleton.get_instance()
 GITHUB = GithubSingleton.get_instance()
 LOGGER = logging.getLogger()
 
+# Files in the dotfiles repository consumed by the configure steps, which are
+# the only ones checked out by a sparse clone
+SPARSE_PATTERNS = ('/.vimrc', '/.bash_profile', '/init.el')
+MANIFEST_FILE = f'{SETUP.directories.cache}/dotfiles/manifest.json'
+BACKUP_SUFFIX = '.dotfiles-backup'
+
 
 def user_has_dotfiles_repo() -> bool:
     """
     Check if the user has the `dotfiles` repository on Github to configure
-    during the process
+    during the process, through the GraphQL account probe before falling back
+    to SSH. A missing repository in the probe is only conclusive when the
+    token has the 'repo' scope, as private repositories are hidden otherwise,
+    so it's confirmed over SSH instead
     """
     source = f'git@github.com:{GITHUB.username}/dotfiles.git'
+    probe = GITHUB.probe_account()
 
-    command = f'git ls-remote {source}'
-    repo_exists = call(command.split(), stdout=DEVNULL) == 0
+    if probe and (probe.dotfiles_exists or probe.private_visible):
+        repo_exists = probe.dotfiles_exists
+        LOGGER.debug(f'Dotfiles repository head - {probe.dotfiles_head}')
+    else:
+        command = f'git ls-remote {source}'
+        repo_exists = call(command.split(), stdout=DEVNULL) == 0
 
     if not repo_exists:
         LOGGER.warning(format_ansi_string(f'This step is optional but it'
@@ -35,192 +54,355 @@ def user_has_dotfiles_repo() -> bool:
     return repo_exists
 
 
+def clone_dotfiles_repository(source: str) -> ProcessResult:
+    """
+    Clones the dotfiles repository, where the sparse mode fetches only the tip
+    commit without any blobs & then checks out just the files consumed by the
+    configure steps
+    """
+    destination = SETUP.directories.dotfiles
+    log_path = f'{SETUP.directories.logs}/dotfiles/clone.log'
+
+    if SETUP.settings.dotfiles_clone == 'full':
+        command = f'git clone {source} {destination}'
+        return run_streamed(command.split(), log_path)
+
+    command = f'git clone --depth=1 --filter=blob:none --no-checkout ' \
+              f'{source} {destination}'
+    result = run_streamed(command.split(), log_path)
+
+    if result.returncode != 0:
+        return result
+
+    command = ['git', '-C', destination, 'sparse-checkout', 'set',
+               '--no-cone', *SPARSE_PATTERNS]
+    result = run_streamed(command, log_path)
+
+    if result.returncode != 0:
+        return result
+
+    command = f'git -C {destination} checkout'
+    return run_streamed(command.split(), log_path)
+
+
+def sync_dotfiles_repository():
+    """
+    Fast-forwards the existing dotfiles checkout to the tip of its remote,
+    where a shallow checkout is moved onto the newly fetched tip instead
+    """
+    destination = SETUP.directories.dotfiles
+    log_path = f'{SETUP.directories.logs}/dotfiles/sync.log'
+    shallow = fs.exists(f'{destination}/.git/shallow')
+
+    command = f'git -C {destination} fetch {"--depth=1 " if shallow else ""}' \
+              f'origin HEAD'
+    returncode, out, err = run_streamed(command.split(), log_path)
+
+    if returncode == 0:
+        command = f'git -C {destination} ' \
+                  f'{"reset --keep" if shallow else "merge --ff-only"} ' \
+                  f'FETCH_HEAD'
+        returncode, out, err = run_streamed(command.split(), log_path)
+
+    if returncode != 0:
+        LOGGER.error(err)
+        LOGGER.error(format_ansi_string('Failed to sync dotfile settings '
+                                        'from github', ForeGroundColor.RED))
+        sys.exit()
+
+    LOGGER.debug(out)
+    LOGGER.info(format_ansi_string('Dotfile settings are synced with github',
+                                   ForeGroundColor.GREEN))
+
+
+def read_manifest() -> Dict[str, dict]:
+    """
+    Returns the manifest of the dotfiles last deployed, keyed by destination
+    """
+    try:
+        return json.loads(fs.read_text(MANIFEST_FILE))
+    except (fs.FileOperationError, ValueError):
+        return {}
+
+
+def is_linked(source: str, destination: str) -> bool:
+    """
+    Check whether the destination is a symlink or hardlink to the source
+    """
+    if os.path.islink(destination):
+        return os.path.realpath(destination) == os.path.realpath(source)
+    return fs.exists(destination) and os.path.samefile(source, destination)
+
+
+def backup_conflicting_file(source: str, destination: str,
+                            entry: dict) -> str:
+    """
+    Moves the file at the destination aside if it wasn't deployed from the
+    dotfiles repository, returning the path of the backup if one was made
+    """
+    if is_linked(source, destination) or \
+            (not os.path.islink(destination) and
+             entry.get('hash') == fs.hash_file(destination)):
+        return entry.get('backup')
+
+    backup = f'{destination}{BACKUP_SUFFIX}'
+    index = 1
+    while fs.exists(backup):
+        backup = f'{destination}{BACKUP_SUFFIX}.{index}'
+        index += 1
+
+    fs.move(destination, backup)
+    LOGGER.info(format_ansi_string(f'\"{destination}\" backed up to '
+                                   f'\"{backup}\"', ForeGroundColor.YELLOW))
+    return backup
+
+
+def deploy_dotfile(source: str, destination: str) -> bool:
+    """
+    Deploys the file from the dotfiles repository by copying or linking it,
+    returning whether anything was written. Links that already point at the
+    repository are left as is, as are copies in sync mode whose content
+    matches the manifest & which are unchanged since they were recorded
+    """
+    mode = SETUP.settings.dotfiles_deploy
+    manifest = read_manifest()
+    source_hash = fs.hash_file(source)
+    entry = manifest.get(destination, {})
+    backup = entry.get('backup')
+
+    if mode != 'copy':
+        if is_linked(source, destination) and \
+                os.path.islink(destination) == (mode == 'symlink'):
+            return False
+
+        if fs.exists(destination):
+            backup = backup_conflicting_file(source, destination, entry)
+
+        if mode == 'symlink':
+            fs.symlink(source, destination)
+        else:
+            fs.hardlink(source, destination)
+    else:
+        if SETUP.settings.dotfiles_sync and entry.get('mode') == 'copy' and \
+                entry.get('hash') == source_hash and \
+                fs.exists(destination) and not is_linked(source, destination):
+            status = os.stat(destination)
+            if [status.st_size, status.st_mtime_ns] == entry.get('stat') or \
+                    fs.hash_file(destination) == source_hash:
+                return False
+
+        # Writing through a link would truncate the file in the repository
+        if fs.exists(destination) and is_linked(source, destination):
+            fs.remove(destination)
+
+        fs.copy_file(source, destination)
+
+    status = os.lstat(destination)
+    manifest[destination] = {'mode': mode, 'hash': source_hash,
+                             'stat': [status.st_size, status.st_mtime_ns]}
+    if backup:
+        manifest[destination]['backup'] = backup
+
+    fs.atomic_write(MANIFEST_FILE, json.dumps(manifest, indent=4))
+    return True
+
+
 def pull_dotfile_settings():
     """
     Pull the dotfiles repository from the github account assuming the user has
     this repository setup
     """
-    command = f'find {SETUP.directories.dotfiles}'
-    directory_found = call(command.split(), stdout=DEVNULL) == 0
+    if fs.exists(SETUP.directories.dotfiles) and SETUP.settings.dotfiles_sync:
+        sync_dotfiles_repository()
+        return
 
-    if directory_found:
+    if fs.exists(SETUP.directories.dotfiles):
         LOGGER.info(format_ansi_string('Dotfile settings already pulled from '
                                        'git', ForeGroundColor.LIGHT_GREEN))
         return
 
     source = f'git@github.com:{GITHUB.username}/dotfiles.git'
-    command = f'git clone {source} {SETUP.directories.dotfiles}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-        cloned_successfully = process.returncode == 0
-
-        if err and not cloned_successfully:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to clone dotfile settings '
-                                            'from github',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Dotfile settings has successfully '
-                                           'been cloned from github',
-                                           ForeGroundColor.GREEN))
+    returncode, out, err = clone_dotfiles_repository(source)
+    cloned_successfully = returncode == 0
+
+    if not cloned_successfully:
+        LOGGER.error(err)
+        LOGGER.error(format_ansi_string('Failed to clone dotfile settings '
+                                        'from github',
+                                        ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string('Dotfile settings has successfully '
+                                       'been cloned from github',
+                                       ForeGroundColor.GREEN))
 
 
 def configure_vimrc():
     """
     Copies vimrc from dotfile settings to user settings
     """
-    command = f'find {SETUP.directories.dotfiles}/.vimrc'
-    dotfiles_vimrc_exists = call(command.split(), stdout=DEVNULL) == 0
-
-    if not dotfiles_vimrc_exists:
+    if not fs.exists(f'{SETUP.directories.dotfiles}/.vimrc'):
         LOGGER.info(format_ansi_string('Missing the \'.vimrc\' file in the '
                                        'dotfiles repository',
                                        ForeGroundColor.YELLOW))
         return
 
-    command = f'cp {SETUP.directories.dotfiles}/.vimrc {SETUP.files.vim}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to configure vimrc from '
-                                            'the dotfiles repository',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Vimrc now configured from the '
-                                           'dotfiles repository',
-                                           ForeGroundColor.GREEN))
+    try:
+        deployed = deploy_dotfile(f'{SETUP.directories.dotfiles}/.vimrc',
+                                  SETUP.files.vim)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('Failed to configure vimrc from '
+                                        'the dotfiles repository',
+                                        ForeGroundColor.RED))
+        sys.exit()
+
+    if not deployed:
+        LOGGER.info(format_ansi_string('Vimrc is already up to date with the '
+                                       'dotfiles repository',
+                                       ForeGroundColor.LIGHT_GREEN))
+    else:
+        LOGGER.info(format_ansi_string('Vimrc now configured from the '
+                                       'dotfiles repository',
+                                       ForeGroundColor.GREEN))
 
 
 def configure_bash_profile():
     """
     Copies bash profile from dotfile settings to user settings
     """
-    command = f'find {SETUP.directories.dotfiles}/.bash_profile'
-    dotfiles_bash_profile_exists = call(command.split(), stdout=DEVNULL) == 0
-
-    if not dotfiles_bash_profile_exists:
+    if not fs.exists(f'{SETUP.directories.dotfiles}/.bash_profile'):
         LOGGER.info(format_ansi_string('Missing the \'.bash_profile\' file in '
                                        'the dotfiles repository',
                                        ForeGroundColor.YELLOW))
         return
 
-    command = f'cp {SETUP.directories.dotfiles}/.bash_profile ' \
-              f'{SETUP.files.bash}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to configure bash_profile'
-                                            ' from the dotfiles repository',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Bash profile now configured from '
-                                           'the dotfiles repository',
-                                           ForeGroundColor.GREEN))
+    try:
+        deployed = deploy_dotfile(
+            f'{SETUP.directories.dotfiles}/.bash_profile', SETUP.files.bash)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('Failed to configure bash_profile'
+                                        ' from the dotfiles repository',
+                                        ForeGroundColor.RED))
+        sys.exit()
+
+    if not deployed:
+        LOGGER.info(format_ansi_string('Bash profile is already up to date '
+                                       'with the dotfiles repository',
+                                       ForeGroundColor.LIGHT_GREEN))
+    else:
+        LOGGER.info(format_ansi_string('Bash profile now configured from '
+                                       'the dotfiles repository',
+                                       ForeGroundColor.GREEN))
 
 
 def configure_emacs():
     """
     Copies init.el file from dotfile settings to user settings
     """
-    command = f'mkdir -p {SETUP.directories.emacs}'
-    call(command.split(), stdout=DEVNULL)
-
-    command = f'find {SETUP.directories.dotfiles}/init.el'
-    dotfiles_emacs_config_exists = call(command.split(), stdout=DEVNULL) == 0
-
-    if not dotfiles_emacs_config_exists:
+    if not fs.exists(f'{SETUP.directories.dotfiles}/init.el'):
         LOGGER.info(format_ansi_string('Missing the \'init.el\' file in '
                                        'the dotfiles repository',
                                        ForeGroundColor.YELLOW))
         return
 
-    command = f'cp {SETUP.directories.dotfiles}/init.el ' \
-              f'{SETUP.files.emacs}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to configure emacs '
-                                            'settings from the dotfiles '
-                                            'repository', ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Emacs settings are now '
-                                           'configured from the dotfiles '
-                                           'repository', ForeGroundColor.GREEN))
+    try:
+        fs.makedirs(SETUP.directories.emacs)
+        deployed = deploy_dotfile(f'{SETUP.directories.dotfiles}/init.el',
+                                  SETUP.files.emacs)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('Failed to configure emacs '
+                                        'settings from the dotfiles '
+                                        'repository', ForeGroundColor.RED))
+        sys.exit()
+
+    if not deployed:
+        LOGGER.info(format_ansi_string('Emacs settings are already up to '
+                                       'date with the dotfiles repository',
+                                       ForeGroundColor.LIGHT_GREEN))
+    else:
+        LOGGER.info(format_ansi_string('Emacs settings are now '
+                                       'configured from the dotfiles '
+                                       'repository', ForeGroundColor.GREEN))
 
 
 def remove_dotfiles_repository():
     """
     Remove dotfiles setting repository cloned from github
     """
-    command = f'find {SETUP.directories.dotfiles}'
-    directory_found = call(command.split(), stdout=DEVNULL) == 0
-
-    if not directory_found:
+    if not fs.exists(SETUP.directories.dotfiles):
         LOGGER.info(format_success_message(
             'Dotfile settings has been already removed'))
         return
 
-    command = f'rm -rf {SETUP.directories.dotfiles}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to remove the dotfiles '
-                                            'settings repository cloned from '
-                                            'github', ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_success_message('Dotfiles settings repository '
-                                               'cloned from github has '
-                                               'successfully been removed'))
+    try:
+        fs.remove_tree(SETUP.directories.dotfiles)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('Failed to remove the dotfiles '
+                                        'settings repository cloned from '
+                                        'github', ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.info(format_success_message('Dotfiles settings repository '
+                                           'cloned from github has '
+                                           'successfully been removed'))
 
 
 def remove_user_dotfiles():
     """
-    Remove dotfiles setting in $HOME, bash, vim & emacs if applicable
+    Remove dotfiles setting in $HOME, bash, vim & emacs if applicable, which
+    unlinks linked dotfiles & restores the files they replaced
     """
+    manifest = read_manifest()
+
     def remove_file(filename: str):
         """
         Helper method to remove individual user config files
         """
-        command = f'find {filename}'
-        file_found = call(command.split(), stdout=DEVNULL) == 0
+        backup = manifest.get(filename, {}).get('backup')
 
-        if not file_found:
+        if not fs.exists(filename):
             LOGGER.info(format_success_message(
                 f'\"{filename}\" has been already removed'))
-            return
-
-        command = f'rm {filename}'
-        with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-            out, err = process.communicate()
-
-            if err:
-                LOGGER.error(err.decode('utf-8'))
+        else:
+            try:
+                fs.remove(filename)
+            except fs.FileOperationError as fs_err:
+                LOGGER.error(str(fs_err))
                 LOGGER.error(format_ansi_string(
                     f'Failed to remove \"{filename}\"', ForeGroundColor.RED))
                 sys.exit()
             else:
-                LOGGER.debug(out.decode('utf-8'))
                 LOGGER.info(format_ansi_string(
-                    f'\"{filename}\" has successfully been removed', ForeGroundColor.GREEN))
+                    f'\"{filename}\" has successfully been removed',
+                    ForeGroundColor.GREEN))
+
+        if not backup or not fs.exists(backup):
+            return
+
+        try:
+            fs.move(backup, filename)
+        except fs.FileOperationError as fs_err:
+            LOGGER.error(str(fs_err))
+            LOGGER.error(format_ansi_string(
+                f'Failed to restore \"{filename}\" from \"{backup}\"',
+                ForeGroundColor.RED))
+            sys.exit()
+        else:
+            LOGGER.info(format_ansi_string(
+                f'\"{filename}\" has been restored from \"{backup}\"',
+                ForeGroundColor.GREEN))
 
     remove_file(SETUP.files.bash)
     remove_file(SETUP.files.vim)
     remove_file(SETUP.files.emacs)
+
+    try:
+        fs.remove(MANIFEST_FILE)
+    except fs.FileOperationError as fs_err:
+        LOGGER.warning(format_ansi_string(str(fs_err),
+                                          ForeGroundColor.YELLOW))
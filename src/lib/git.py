@@ -4,11 +4,12 @@ Module delegated to handling git logic
 
 # Native Modules
 import logging
-import re
+from typing import Dict
 
 from singletons.github import GithubSingleton
 from singletons.setup import SetupSingleton
 from utils.general import format_ansi_string, format_success_message
+from utils.ssh_config import SshConfig, filter_known_hosts
 from utils.unicode import ForeGroundColor
 
 # Custom Modules
@@ -18,18 +19,36 @@ SETUP = SetupSingleton.get_instance()
 GITHUB = GithubSingleton.get_instance()
 LOGGER = logging.getLogger()
 
+GITHUB_HOSTS = ('github.com',)
 
-def public_key_exists_on_github() -> bool:
+
+def get_github_key_index() -> Dict[str, int]:
     """
-    Check if current public key passed in exists on github
+    Index the id of every public key on github by its SHA256 fingerprint,
+    streamed across all pages of the user's keys
     """
-    current_key = ssh.get_public_key()
-    public_keys = GITHUB.get_public_keys().json()
+    index = {}
 
-    pattern = re.compile(re.escape(current_key))
+    for key in GITHUB.iterate_public_keys():
+        fingerprint = ssh.fingerprint_public_key(key['key'])
+        if fingerprint:
+            index[fingerprint] = key['id']
+    return index
 
-    key_found = next(filter(
-        lambda x: re.match(pattern, x['key']), public_keys), None)
+
+def public_key_exists_on_github() -> bool:
+    """
+    Check if current public key passed in exists on github, from the keys
+    already listed during the run if any, otherwise through the account probe
+    """
+    fingerprint = ssh.fingerprint_public_key(ssh.get_public_key())
+    probe = None if GITHUB.public_keys_cached() else GITHUB.probe_account()
+
+    if probe:
+        key_found = fingerprint in map(ssh.fingerprint_public_key,
+                                       probe.public_keys)
+    else:
+        key_found = fingerprint in get_github_key_index()
 
     if key_found:
         LOGGER.info(format_ansi_string('Git SSH has already been configured on'
@@ -38,7 +57,7 @@ def public_key_exists_on_github() -> bool:
         LOGGER.info(format_ansi_string('Git SSH is not configured on Github',
                                        ForeGroundColor.LIGHT_RED))
 
-    return key_found is not None
+    return key_found
 
 
 def upload_ssh_key_to_github():
@@ -55,19 +74,19 @@ def upload_ssh_key_to_github():
     GITHUB.create_public_key(payload)
 
 
-def delete_github_pub_key(current_key: str, public_keys: list):
+def delete_github_pub_key(current_key: str):
     """
     Removes current public key in host machine stored on github
     """
-    pattern = re.compile(re.escape(current_key))
-
-    for key in public_keys:
-        if re.match(pattern, key['key']):
-            GITHUB.delete_public_key(key['id'])
-            LOGGER.info(format_ansi_string('Provided public key now deleted '
-                                           'from github account',
-                                           ForeGroundColor.GREEN))
-            return
+    fingerprint = ssh.fingerprint_public_key(current_key)
+    key_id = get_github_key_index().get(fingerprint)
+
+    if key_id is not None:
+        GITHUB.delete_public_key(key_id)
+        LOGGER.info(format_ansi_string('Provided public key now deleted '
+                                       'from github account',
+                                       ForeGroundColor.GREEN))
+        return
     LOGGER.warning(format_ansi_string('Provided public key does not exist on '
                                       'GitHub or incorrect arguments',
                                       ForeGroundColor.YELLOW))
@@ -75,54 +94,31 @@ def delete_github_pub_key(current_key: str, public_keys: list):
 
 def remove_ssh_config():
     """
-    Removes the identity value of the rsa private key from the ssh config file
+    Removes the identity value of the private key from the ssh config file
     """
-    ssh_config_file = f'{SETUP.directories.ssh}/config'
+    ssh_config = SshConfig(f'{SETUP.directories.ssh}/config')
 
-    with open(ssh_config_file) as text_file:
-        content = ''.join(text_file.readlines())
-
-    pattern = re.compile(r'IdentityFile .*')
-    key_match = re.search(pattern, content)
-
-    if not key_match:
+    if not ssh_config.remove('IdentityFile', ssh.PRIVATE_KEY):
         LOGGER.info(format_ansi_string('IdentityFile key value already '
                                        'deleted from ssh config file',
                                        ForeGroundColor.LIGHT_GREEN))
         return
 
-    start, end = key_match.span()
-
-    content = content[:start] + content[end:]
-    with open(ssh_config_file, 'w') as text_file:
-        text_file.write(content)
-
+    ssh_config.save()
     LOGGER.info(format_ansi_string('IdentityFile key value is now removed from'
                                    ' ssh config file', ForeGroundColor.GREEN))
 
 
 def remove_ssh_github_host():
     """
-    Remove host key & agent from known_host file in .ssh directory
+    Remove host keys of GitHub from known_host file in .ssh directory
     """
     known_hosts = f'{SETUP.directories.ssh}/known_hosts'
 
-    with open(known_hosts) as text_file:
-        content = ''.join(text_file.readlines())
-
-    pattern = re.compile(r'github.* ssh-rsa .*')
-    key_match = re.search(pattern, content)
-
-    if not key_match:
+    if not filter_known_hosts(known_hosts, GITHUB_HOSTS):
         LOGGER.info(format_success_message(
             'Github host value already deleted from known_host file'))
         return
 
-    start, end = key_match.span()
-
-    content = content[:start] + content[end:]
-    with open(known_hosts, 'w') as text_file:
-        text_file.write(content)
-
     LOGGER.info(format_success_message(
         'Github host value is now removed from known_host file'))
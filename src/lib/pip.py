@@ -3,26 +3,42 @@ Module delegated to handling PIP logic
 """
 
 # Native Modules
+import glob
+import json
 import logging
-import sys
-from itertools import tee
-from subprocess import PIPE, Popen, check_output
-from typing import List
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+from typing import Dict, List, Set, Tuple
 
 # Custom Modules
 from singletons.setup import SetupSingleton
+from utils import fs
 from utils.general import (consume, format_ansi_string, format_success_message,
                            partition)
+from utils.process import run_streamed
 from utils.unicode import ForeGroundColor
 
 SETUP = SetupSingleton.get_instance()
 LOGGER = logging.getLogger()
 
+NAME_SEPARATOR_PATTERN = re.compile(r'[-_.]+')
+REQUIREMENT_NAME_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]*')
 
-def retrieve_processed_packages(filename: str = None) -> List[str]:
+
+def canonicalize_name(name: str) -> str:
+    """
+    Normalises a package name the way PyPI compares them, so 'Foo_Bar' &
+    'foo-bar' refer to the same package
     """
-    Parses the output format generated from 'pip3 list --user' from either the
-    the config directory for PIP or the user system
+    return NAME_SEPARATOR_PATTERN.sub('-', name).lower()
+
+
+def retrieve_processed_packages(filename: str) -> List[str]:
+    """
+    Parses the output format generated from 'pip3 list --user' from the
+    config directory for PIP
 
     The output will look like this (excluding the (-|+) border):
     +-------------------------------+
@@ -36,85 +52,404 @@ def retrieve_processed_packages(filename: str = None) -> List[str]:
     We need to parse from the third line onwards & install the latest by
     reading the first column only of each line based on this 'assumption'
     """
-    if not filename:
-        command = "pip3 list --user"
-        output = check_output(command.split())
-        pip_list = output.decode('utf-8').strip().split('\n')[2:]
-        packages = [x.split()[0] for x in pip_list]
-    else:
-        with open(filename) as text_file:
-            data = [x.strip() for x in text_file.readlines()[2:]]
-            packages = [x.split()[0] for x in data]
+    with open(filename) as text_file:
+        data = [x.strip() for x in text_file.readlines()[2:]]
+        packages = [x.split()[0] for x in data if x]
     return packages
 
 
+def retrieve_user_packages() -> Dict[str, str]:
+    """
+    Reads the metadata of every distribution installed in the user site
+    directly, returning the installed version by canonicalized package name
+    """
+    distributions = metadata.distributions(
+        path=[SETUP.directories.python_site])
+
+    return {canonicalize_name(x.metadata['Name']): x.version
+            for x in distributions if x.metadata['Name']}
+
+
+def resolve_installed_versions(packages: List[str]) -> Dict[str, str]:
+    """
+    Resolves the installed version of every package passed in & all of its
+    dependencies installed in the user site, walking the requirements
+    recorded in each distribution's metadata
+    """
+    distributions = {canonicalize_name(x.metadata['Name']): x
+                     for x in metadata.distributions(
+                         path=[SETUP.directories.python_site])
+                     if x.metadata['Name']}
+    versions = {}
+    pending = [canonicalize_name(x) for x in packages]
+
+    while pending:
+        package = pending.pop()
+        if package in versions or package not in distributions:
+            continue
+
+        distribution = distributions[package]
+        versions[package] = distribution.version
+
+        for requirement in distribution.requires or []:
+            if 'extra ==' in requirement:
+                continue
+            name = REQUIREMENT_NAME_PATTERN.match(requirement)
+            if name:
+                pending.append(canonicalize_name(name.group(0)))
+    return versions
+
+
+def read_lock_file() -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Returns the pinned versions & artifact hashes of the lock file if it was
+    generated from the current content of the configured packages, otherwise
+    empty dicts
+    """
+    try:
+        with open(SETUP.files.pip_lock) as json_file:
+            lock = json.load(json_file)
+    except (OSError, ValueError):
+        return {}, {}
+
+    if lock.get('source_hash') != fs.hash_file(SETUP.files.pip):
+        LOGGER.info(format_ansi_string('PIP lock file is outdated, resolving '
+                                       'the configured packages again',
+                                       ForeGroundColor.LIGHT_RED))
+        return {}, {}
+    return lock.get('packages', {}), lock.get('hashes', {})
+
+
+def retrieve_artifact_hashes(versions: Dict[str, str]) \
+        -> Dict[str, List[str]]:
+    """
+    Fills the wheelhouse with a wheel for every pinned version in a single
+    pass, reusing the wheels already in it, & returns the sha256 of the wheels
+    of each pin by package name. Pins without a wheel are left out, as the
+    lock still covers them once they're installed at their pinned version
+    """
+    wheelhouse = f'{SETUP.directories.cache}/pip/wheelhouse'
+    fs.makedirs(wheelhouse)
+
+    command = ['pip3', 'wheel', '--no-deps', '--wheel-dir', wheelhouse,
+               '--find-links', wheelhouse,
+               *[f'{name}=={version}' for name, version in versions.items()]]
+    returncode, _, err = run_streamed(
+        command, f'{SETUP.directories.logs}/pip/lock.log')
+
+    if returncode != 0:
+        LOGGER.debug(err)
+        LOGGER.warning(format_ansi_string('Failed to build the wheels of '
+                                          'every pinned pip package, some '
+                                          'pins are locked without hashes',
+                                          ForeGroundColor.YELLOW))
+
+    hashes = {}
+    for filename in sorted(os.listdir(wheelhouse)):
+        if not filename.endswith('.whl'):
+            continue
+
+        name, version = filename.split('-')[:2]
+        name = canonicalize_name(name)
+
+        if versions.get(name) == version:
+            hashes.setdefault(name, []).append(
+                fs.hash_file(f'{wheelhouse}/{filename}'))
+    return hashes
+
+
+def write_lock_file(packages: List[str]):
+    """
+    Records the fully resolved versions of the configured packages & the
+    sha256 of their wheels into the lock file, along with the hash of the
+    configuration it was resolved from
+    """
+    lock = {
+        'source_hash': fs.hash_file(SETUP.files.pip),
+        'packages': resolve_installed_versions(packages)
+    }
+    lock['hashes'] = retrieve_artifact_hashes(lock['packages'])
+
+    fs.atomic_write(SETUP.files.pip_lock,
+                    json.dumps(lock, indent=4, sort_keys=True))
+
+    LOGGER.info(format_ansi_string(f'PIP lock file generated - '
+                                   f'{SETUP.files.pip_lock}',
+                                   ForeGroundColor.GREEN))
+
+
+def install_locked_packages(configured_packages: List[str],
+                            pinned_versions: Dict[str, str],
+                            hashes: Dict[str, List[str]]) -> bool:
+    """
+    Installs the exact pinned versions of the lock file in a single invocation
+    without any dependency resolution, in hash-checking mode so every wheel
+    is verified against the hashes of the lock file. The wheels recorded when
+    the lock was generated are installed from the wheelhouse, while packages
+    already installed at their pinned version are skipped without touching the
+    network
+    """
+    configured = {canonicalize_name(x): x for x in configured_packages}
+
+    if any(x not in pinned_versions for x in configured):
+        LOGGER.info(format_ansi_string('PIP lock file is missing configured '
+                                       'packages, resolving the configured '
+                                       'packages again',
+                                       ForeGroundColor.LIGHT_RED))
+        return False
+
+    user_packages = retrieve_user_packages()
+    pending = {name: version for name, version in pinned_versions.items()
+               if user_packages.get(name) != version}
+
+    consume(map(lambda x: LOGGER.info(
+        format_ansi_string(f'{x} - already installed',
+                           ForeGroundColor.LIGHT_GREEN)),
+        [v for k, v in configured.items() if k not in pending]))
+
+    if not pending:
+        LOGGER.info(format_success_message(
+            'No available pip packages to install'))
+        return True
+
+    if any(not hashes.get(x) for x in pending):
+        LOGGER.info(format_ansi_string('PIP lock file is missing the hashes '
+                                       'of pinned packages, resolving the '
+                                       'configured packages again',
+                                       ForeGroundColor.LIGHT_RED))
+        return False
+
+    wheelhouse = f'{SETUP.directories.cache}/pip/wheelhouse'
+    requirements = f'{SETUP.directories.cache}/pip/locked-requirements.txt'
+    fs.makedirs(os.path.dirname(requirements))
+    fs.atomic_write(requirements, ''.join(
+        f'{name}=={version} '
+        f'{" ".join(f"--hash=sha256:{x}" for x in hashes[name])}\n'
+        for name, version in pending.items()))
+
+    command = ['pip3', 'install', '--user', '--no-deps', '--require-hashes',
+               '--find-links', wheelhouse]
+    if SETUP.settings.pip_wheelhouse:
+        command.append('--no-index')
+    command += ['-r', requirements]
+
+    returncode, out, err = run_streamed(
+        command, f'{SETUP.directories.logs}/pip/locked.log')
+
+    if returncode != 0:
+        LOGGER.warning(err)
+        LOGGER.warning(format_ansi_string('Failed to install the pinned '
+                                          'versions of the PIP lock file',
+                                          ForeGroundColor.YELLOW))
+        return False
+
+    LOGGER.debug(out)
+    consume(map(lambda x: LOGGER.info(
+        format_ansi_string(f'{x} - successfully installed',
+                           ForeGroundColor.GREEN)),
+        [v for k, v in configured.items() if k in pending]))
+    LOGGER.info(format_success_message(
+        'All configured pip packages are now installed'))
+    return True
+
+
+def install_from_wheelhouse(packages: List[str]) -> bool:
+    """
+    Installs the packages from the local wheelhouse without any index access.
+    When the wheelhouse is missing any of the wheels required, all packages
+    are resolved in a single pass & their wheels are built or downloaded into
+    the wheelhouse beforehand
+    """
+    wheelhouse = f'{SETUP.directories.cache}/pip/wheelhouse'
+    log_path = f'{SETUP.directories.logs}/pip/wheelhouse.log'
+
+    install_command = ['pip3', 'install', '--user', '--no-index',
+                       '--find-links', wheelhouse, *packages]
+    returncode, out, _ = run_streamed(install_command, log_path)
+
+    if returncode == 0:
+        LOGGER.debug(out)
+        return True
+
+    LOGGER.info(format_ansi_string('Building the wheelhouse for the '
+                                   'configured pip packages...',
+                                   ForeGroundColor.LIGHT_GREEN))
+
+    wheel_command = ['pip3', 'wheel', '--wheel-dir', wheelhouse,
+                     '--find-links', wheelhouse, *packages]
+    returncode, out, err = run_streamed(wheel_command, log_path)
+
+    if returncode != 0:
+        LOGGER.warning(err)
+        LOGGER.warning(format_ansi_string('Failed to build the wheelhouse, '
+                                          'installing packages individually',
+                                          ForeGroundColor.YELLOW))
+        return False
+
+    returncode, out, err = run_streamed(install_command, log_path)
+
+    if returncode != 0:
+        LOGGER.warning(err)
+        LOGGER.warning(format_ansi_string('Failed to install from the '
+                                          'wheelhouse, installing packages '
+                                          'individually',
+                                          ForeGroundColor.YELLOW))
+        return False
+
+    LOGGER.debug(out)
+    return True
+
+
 def install_all_pip_packages_at_user():
     """
-    Downloads & installs every package config if it's valid
+    Downloads & installs every package config if it's valid. When the lock
+    file matches the configured packages, its pinned versions are installed
+    instead, otherwise the lock file is regenerated after installation
     """
     def process_package(package: str):
         """
         Installs the package if possible & logs correspondingly
         """
         command = f'pip3 install --user {package}'
-        with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-            out, err = process.communicate()
-            installed_successfully = process.returncode == 0
+        returncode, out, err = run_streamed(
+            command.split(), f'{SETUP.directories.logs}/pip/{package}.log')
+        installed_successfully = returncode == 0
 
-            if err and not installed_successfully:
-                LOGGER.warning(err.decode('utf-8'))
-                LOGGER.warning(format_ansi_string(f'{package} - issue during '
-                                                  f'installation or it the '
-                                                  f'package doesn\'t exist',
-                                                  ForeGroundColor.YELLOW))
-            else:
-                LOGGER.debug(out.decode('utf-8'))
-                LOGGER.info(format_ansi_string(f'{package} - successfully '
-                                               f'installed',
-                                               ForeGroundColor.GREEN))
+        if err and not installed_successfully:
+            LOGGER.warning(err)
+            LOGGER.warning(format_ansi_string(f'{package} - issue during '
+                                              f'installation or it the '
+                                              f'package doesn\'t exist',
+                                              ForeGroundColor.YELLOW))
+        else:
+            LOGGER.debug(out)
+            LOGGER.info(format_ansi_string(f'{package} - successfully '
+                                           f'installed',
+                                           ForeGroundColor.GREEN))
 
-    user_packages = retrieve_processed_packages()
     configured_packages = retrieve_processed_packages(SETUP.files.pip)
+    pinned_versions, hashes = read_lock_file()
+
+    if pinned_versions and install_locked_packages(
+            configured_packages, pinned_versions, hashes):
+        return
+
+    user_packages = retrieve_user_packages()
 
     installed_packages, uninstalled_packages = partition(
-        lambda x: x in user_packages, configured_packages)
+        lambda x: canonicalize_name(x) in user_packages, configured_packages)
 
     consume(map(lambda x: LOGGER.info(
         format_ansi_string(f'{x} - already installed',
                            ForeGroundColor.LIGHT_GREEN)), installed_packages))
 
-    uninstalled_packages, uninstalled_packages_copy = tee(uninstalled_packages)
-
-    if not next(uninstalled_packages_copy, None):
+    if not uninstalled_packages:
         LOGGER.info(format_success_message(
             'No available pip packages to install'))
+    elif SETUP.settings.pip_wheelhouse and \
+            install_from_wheelhouse(uninstalled_packages):
+        user_packages = retrieve_user_packages()
+
+        for package in uninstalled_packages:
+            if canonicalize_name(package) in user_packages:
+                LOGGER.info(format_ansi_string(f'{package} - successfully '
+                                               f'installed',
+                                               ForeGroundColor.GREEN))
+            else:
+                LOGGER.warning(format_ansi_string(f'{package} - issue during '
+                                                  f'installation',
+                                                  ForeGroundColor.YELLOW))
+        LOGGER.info(format_success_message(
+            'All configured pip packages are now installed'))
     else:
         consume(map(lambda x: process_package(x), uninstalled_packages))
         LOGGER.info(format_success_message(
             'All configured pip packages are now installed'))
 
+    write_lock_file(configured_packages)
 
-def delete_all_user_packages():
+
+def uninstall_distribution(distribution: metadata.Distribution) \
+        -> Tuple[str, bool, Set[str]]:
+    """
+    Removes every file recorded for the distribution, along with the bytecode
+    compiled from its modules. Returns the package name, whether it was
+    uninstalled & the directories it left behind to prune
+    """
+    name = distribution.metadata['Name']
+
+    if distribution.files is None:
+        return name, False, set()
+
+    directories = set()
+    for file in distribution.files:
+        path = str(distribution.locate_file(file))
+        paths = [path]
+
+        if path.endswith('.py'):
+            directory, module = os.path.split(path)
+            pattern = f'{directory}/__pycache__/{module[:-3]}.*.pyc'
+            paths.extend(glob.glob(pattern))
+            directories.add(f'{directory}/__pycache__')
+
+        for path in paths:
+            try:
+                fs.remove(path)
+            except fs.FileOperationError as fs_err:
+                LOGGER.debug(f'{name} - {fs_err}')
+                return name, False, directories
+            directories.add(os.path.dirname(path))
+    return name, True, directories
+
+
+def prune_directories(directories: Set[str], root: str):
     """
-    Uninstalls all PIP packages at the user level
+    Removes the empty directories passed in & their empty parents, deepest
+    first, without leaving the root directory
     """
-    command = "pip3 freeze --user"
-    pip_freeze_process = Popen(command.split(), stdout=PIPE)
+    root = os.path.abspath(root)
+    pending = set()
 
-    command = "xargs pip3 uninstall -y"
-    with Popen(command.split(), stdin=pip_freeze_process.stdout, stdout=PIPE) \
-            as process:
-        out, err = process.communicate()
+    for directory in map(os.path.abspath, directories):
+        while directory.startswith(f'{root}{os.sep}'):
+            pending.add(directory)
+            directory = os.path.dirname(directory)
 
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to delete PIP packages '
-                                            'via piped shell process',
-                                            ForeGroundColor.RED))
-            sys.exit()
+    for directory in sorted(pending, key=len, reverse=True):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
 
-        parsed_output = out.decode('utf-8')
 
-        LOGGER.debug(parsed_output)
+def delete_all_user_packages():
+    """
+    Uninstalls all PIP packages at the user level, removing the files recorded
+    for every distribution in the user site concurrently
+    """
+    distributions = [x for x in metadata.distributions(
+        path=[SETUP.directories.python_site]) if x.metadata['Name']]
+
+    if not distributions:
         LOGGER.info(format_success_message(
-            'All configured PIP packages are now deleted'))
+            'PIP packages at the user level are already deleted'))
+        return
+
+    with ThreadPoolExecutor() as executor:
+        results = list(executor.map(uninstall_distribution, distributions))
+
+    prune_directories(set().union(*(x[2] for x in results)),
+                      SETUP.directories.python_site)
+
+    for name, uninstalled, _ in results:
+        if uninstalled:
+            LOGGER.info(format_ansi_string(f'{name} - successfully '
+                                           f'uninstalled',
+                                           ForeGroundColor.GREEN))
+        else:
+            LOGGER.warning(format_ansi_string(f'{name} - issue during '
+                                              f'uninstallation',
+                                              ForeGroundColor.YELLOW))
+
+    LOGGER.info(format_success_message(
+        'All configured PIP packages are now deleted'))
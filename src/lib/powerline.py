@@ -7,12 +7,13 @@ import json
 import logging
 import re
 import sys
-from subprocess import DEVNULL, PIPE, Popen, call
 
 from singletons.github import GithubSingleton
 # Custom Modules
 from singletons.setup import SetupSingleton
+from utils import fs
 from utils.general import format_ansi_string, format_success_message
+from utils.process import run_streamed
 from utils.unicode import ForeGroundColor
 
 SETUP = SetupSingleton.get_instance()
@@ -25,47 +26,47 @@ def install_powerline_at_user():
     Installs the powerline tool at the user level of the system
     """
     command = 'pip3 install --user powerline-status'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
+    _, out, err = run_streamed(
+        command.split(), f'{SETUP.directories.logs}/pip/powerline-status.log')
 
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to install powerline from '
-                                            'pip3', ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Powerline now installed from pip3 '
-                                           'at the user level',
-                                           ForeGroundColor.GREEN))
+    if err:
+        LOGGER.error(err)
+        LOGGER.error(format_ansi_string('Failed to install powerline from '
+                                        'pip3', ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string('Powerline now installed from pip3 '
+                                       'at the user level',
+                                       ForeGroundColor.GREEN))
 
 
 def configure_user_config():
     """
     Checks & creates proper directory for the powerline configs to go
     """
-    command = f'mkdir -p {SETUP.directories.powerline}'
-    call(command.split(), stdout=DEVNULL)
+    try:
+        fs.makedirs(SETUP.directories.powerline)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        sys.exit()
 
     LOGGER.info(format_ansi_string(f'{SETUP.directories.powerline} - has '
                                    f'been created', ForeGroundColor.GREEN))
 
-    command = f'cp -r {SETUP.directories.python_site}/powerline/config_files/ ' \
-              f'{SETUP.directories.powerline}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to copy powerline config '
-                                            'from system to user directory',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Successfully copied powerline '
-                                           'config from system to user '
-                                           'directory', ForeGroundColor.GREEN))
+    try:
+        fs.copy_tree(f'{SETUP.directories.python_site}/powerline/'
+                     f'config_files', SETUP.directories.powerline)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('Failed to copy powerline config '
+                                        'from system to user directory',
+                                        ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.info(format_ansi_string('Successfully copied powerline '
+                                       'config from system to user '
+                                       'directory', ForeGroundColor.GREEN))
 
 
 def install_fonts():
@@ -75,45 +76,42 @@ def install_fonts():
 
     destination = f'{SETUP.directories.powerline}/fonts'
 
-    command = f'find {destination}'
-    directory_found = call(command.split(), stdout=DEVNULL) == 0
-
-    if directory_found:
+    if fs.exists(destination):
         LOGGER.info(format_ansi_string('Powerline fonts are already installed',
                                        ForeGroundColor.LIGHT_GREEN))
         return
 
     source = f'git@github.com:powerline/fonts.git'
     command = f'git clone {source} {destination}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-        cloned_successfully = process.returncode == 0
-
-        if err and not cloned_successfully:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to clone powerline fonts'
-                                            ' from github',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Successfully cloned powerline '
-                                           'fonts from github',
-                                           ForeGroundColor.GREEN))
+    returncode, out, err = run_streamed(
+        command.split(), f'{SETUP.directories.logs}/powerline/clone-fonts.log')
+    cloned_successfully = returncode == 0
+
+    if err and not cloned_successfully:
+        LOGGER.error(err)
+        LOGGER.error(format_ansi_string('Failed to clone powerline fonts'
+                                        ' from github',
+                                        ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string('Successfully cloned powerline '
+                                       'fonts from github',
+                                       ForeGroundColor.GREEN))
 
     command = f'/bin/bash {destination}/install.sh'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
+    _, out, err = run_streamed(
+        command.split(), f'{SETUP.directories.logs}/powerline/fonts.log')
 
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to install powerline '
-                                            'fonts', ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Successfully installed powerline '
-                                           'fonts', ForeGroundColor.GREEN))
+    if err:
+        LOGGER.error(err)
+        LOGGER.error(format_ansi_string('Failed to install powerline '
+                                        'fonts', ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string('Successfully installed powerline '
+                                       'fonts', ForeGroundColor.GREEN))
 
 
 def install_gitstatus_at_user():
@@ -121,20 +119,20 @@ def install_gitstatus_at_user():
     Installs powerline-gitstatus at user level of system
     """
     command = 'pip3 install --user powerline-gitstatus'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to install '
-                                            'powerline-gitstatus through pip3',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Powerline-gitstatus successfully '
-                                           'installed through pip3',
-                                           ForeGroundColor.GREEN))
+    _, out, err = run_streamed(
+        command.split(), f'{SETUP.directories.logs}/pip/gitstatus.log')
+
+    if err:
+        LOGGER.error(err)
+        LOGGER.error(format_ansi_string('Failed to install '
+                                        'powerline-gitstatus through pip3',
+                                        ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string('Powerline-gitstatus successfully '
+                                       'installed through pip3',
+                                       ForeGroundColor.GREEN))
 
 
 def config_git_colorscheme():
@@ -161,8 +159,9 @@ def config_git_colorscheme():
         data = default_data
         data['groups'] = {**default_group, **config_group}
 
-    with open(default_block, 'w+', encoding='utf-8') as default_json:
-        json.dump(data, default_json, ensure_ascii=False, indent=4)
+    with fs.atomic_open(default_block, 'wb') as default_json:
+        default_json.write(json.dumps(data, ensure_ascii=False,
+                                      indent=4).encode('utf-8'))
 
     LOGGER.info(format_ansi_string('Finish configuring color scheme for git '
                                    'status in powerline!',
@@ -195,8 +194,9 @@ def config_git_shell():
         data = default_data
         data['segments']['left'] = function_list
 
-    with open(default_block, 'w+', encoding='utf-8') as default_json:
-        json.dump(data, default_json, ensure_ascii=False, indent=4)
+    with fs.atomic_open(default_block, 'wb') as default_json:
+        default_json.write(json.dumps(data, ensure_ascii=False,
+                                      indent=4).encode('utf-8'))
 
     LOGGER.info(format_ansi_string('Finish configuring shell for git status '
                                    'in powerline!', ForeGroundColor.GREEN))
@@ -210,73 +210,61 @@ def delete_powerline_fonts():
     uninstall_font_script = f'{SETUP.directories.powerline}' \
                             f'/fonts/uninstall.sh'
 
-    command = f'find {uninstall_font_script}'
-    script_exists = call(command.split(), stdout=DEVNULL) == 0
-
-    if not script_exists:
+    if not fs.exists(uninstall_font_script):
         LOGGER.info(format_ansi_string('Powerline fonts are already '
                                        'uninstalled',
                                        ForeGroundColor.LIGHT_GREEN))
         return
 
     command = f'/bin/bash {uninstall_font_script}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to uninstall powerline '
-                                            'fonts in the system level',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Powerline fonts has successfully '
-                                           'been uninstalled in the system '
-                                           'level', ForeGroundColor.GREEN))
-
-    command = f'rm -rf {SETUP.directories.powerline}/fonts'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to remove powerline fonts '
-                                            'in the user level',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Powerline fonts in the user level '
-                                           'has successfully been removed',
-                                           ForeGroundColor.GREEN))
+    _, out, err = run_streamed(
+        command.split(), f'{SETUP.directories.logs}/powerline/uninstall.log')
+
+    if err:
+        LOGGER.error(err)
+        LOGGER.error(format_ansi_string('Failed to uninstall powerline '
+                                        'fonts in the system level',
+                                        ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.debug(out)
+        LOGGER.info(format_ansi_string('Powerline fonts has successfully '
+                                       'been uninstalled in the system '
+                                       'level', ForeGroundColor.GREEN))
+
+    try:
+        fs.remove_tree(f'{SETUP.directories.powerline}/fonts')
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('Failed to remove powerline fonts '
+                                        'in the user level',
+                                        ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.info(format_ansi_string('Powerline fonts in the user level '
+                                       'has successfully been removed',
+                                       ForeGroundColor.GREEN))
 
 
 def delete_powerline_config_folder():
     """
     Deletes the entire powerline folder in user config
     """
-    command = f'find {SETUP.directories.powerline}'
-    directory_found = call(command.split(), stdout=DEVNULL) == 0
-
-    if not directory_found:
+    if not fs.exists(SETUP.directories.powerline):
         LOGGER.info(format_ansi_string('Powerline config at the user config '
                                        'directory has already been removed',
                                        ForeGroundColor.LIGHT_GREEN))
         return
 
-    command = f'rm -rf {SETUP.directories.powerline}'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to remove the powerline '
-                                            'config at the user config '
-                                            'directory', ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('Powerline config has successfully'
-                                           ' been removed at the user config '
-                                           'directory', ForeGroundColor.GREEN))
+    try:
+        fs.remove_tree(SETUP.directories.powerline)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('Failed to remove the powerline '
+                                        'config at the user config '
+                                        'directory', ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.info(format_ansi_string('Powerline config has successfully'
+                                       ' been removed at the user config '
+                                       'directory', ForeGroundColor.GREEN))
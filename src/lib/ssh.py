@@ -2,29 +2,70 @@
 Module delegated to handling ssh logic
 """
 
+import base64
+import binascii
+import hashlib
 import logging
+import os
 import re
+import socket
 # Native Modules
 import sys
 from subprocess import DEVNULL, PIPE, Popen, call
+from typing import Dict
 
 from singletons.github import GithubSingleton
 # Custom Modules
 from singletons.setup import SetupSingleton
-from utils.general import consume, format_ansi_string
+from utils import fs
+from utils.general import format_ansi_string
+from utils.process import find_processes, signal_processes
+from utils.ssh_config import SshConfig
 from utils.unicode import ForeGroundColor
 
 SETUP = SetupSingleton.get_instance()
 GITHUB = GithubSingleton.get_instance()
 LOGGER = logging.getLogger()
 
+KEYGEN_ARGUMENTS = {
+    'rsa': ['-t', 'rsa', '-b', '4096'],
+    'ed25519': ['-t', 'ed25519']
+}
+KEY_TYPE_FILE = f'{SETUP.directories.cache}/ssh-key-type'
+
+
+def resolve_key_type() -> str:
+    """
+    Resolves the key type from the flag, otherwise from the type saved when
+    the script last generated a keypair, so rollback & reruns without the
+    flag act on the same key. Defaults to rsa
+    """
+    if SETUP.settings.ssh_key_type:
+        return SETUP.settings.ssh_key_type
+
+    try:
+        saved_type = fs.read_text(KEY_TYPE_FILE).strip()
+    except fs.FileOperationError:
+        saved_type = None
+
+    return saved_type if saved_type in KEYGEN_ARGUMENTS else 'rsa'
+
+
+KEY_TYPE = resolve_key_type()
+PRIVATE_KEY = f'{SETUP.directories.ssh}/id_{KEY_TYPE}'
+PUBLIC_KEY = f'{PRIVATE_KEY}.pub'
+
+AGENT_ENV_FILE = f'{SETUP.directories.cache}/ssh-agent.env'
+AGENT_VARIABLES = ('SSH_AUTH_SOCK', 'SSH_AGENT_PID')
+AGENT_VARIABLE_PATTERN = re.compile(r'(SSH_AUTH_SOCK|SSH_AGENT_PID)='
+                                    r'([^;\n]+)')
+
 
 def public_key_exists() -> bool:
     """
     Check if public key exists to confirm whether ssh is already configured
     """
-    command = f'find {SETUP.directories.ssh}/id_rsa.pub'
-    file_found = call(command.split(), stdout=DEVNULL, stderr=DEVNULL) == 0
+    file_found = fs.exists(PUBLIC_KEY)
 
     if not file_found:
         LOGGER.info(format_ansi_string('Git SSH hasn\'t been configured '
@@ -36,120 +77,135 @@ def public_key_exists() -> bool:
     return file_found
 
 
-def generate_rsa_keypair():
+def generate_ssh_keypair():
     """
-    Generate asymmetric public/private keypair for ssh use
+    Generate asymmetric public/private keypair of the configured type for ssh
+    use, where ed25519 is much faster to generate & sign with than rsa
     """
-    command = f'ssh-keygen -t rsa -b 4096 -C \"{GITHUB.email}\" -N\
-                {SETUP.ssh_passphrase}'
-    with Popen(command.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE) \
+    command_list = ['ssh-keygen', *KEYGEN_ARGUMENTS[KEY_TYPE], '-C',
+                    GITHUB.email, '-N', SETUP.ssh_passphrase, '-f',
+                    PRIVATE_KEY]
+    with Popen(command_list, stdin=PIPE, stdout=PIPE, stderr=PIPE) \
             as process:
-        out, err = process.communicate(input=b'\ny\n')
+        out, err = process.communicate(input=b'y\n')
 
-        if err:
+        if process.returncode != 0:
             LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('RSA keypair for SSH failed to '
-                                            'generated', ForeGroundColor.RED))
+            LOGGER.error(format_ansi_string(f'{KEY_TYPE.upper()} keypair for '
+                                            f'SSH failed to generated',
+                                            ForeGroundColor.RED))
             sys.exit()
         else:
             LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('RSA keypair for SSH has '
-                                           'successfully been generated',
+            LOGGER.info(format_ansi_string(f'{KEY_TYPE.upper()} keypair for '
+                                           f'SSH has successfully been '
+                                           f'generated',
                                            ForeGroundColor.GREEN))
 
+    fs.makedirs(os.path.dirname(KEY_TYPE_FILE))
+    fs.atomic_write(KEY_TYPE_FILE, f'{KEY_TYPE}\n')
 
-def start_ssh_agent():
+
+def parse_agent_environment(content: str) -> Dict[str, str]:
     """
-    Start ssh-agent process in local machine
+    Parses the variables from the output of 'ssh-agent -s'
     """
-    def find_ssh_process(line):
-        """
-        Processes output to log the ssh agent process
-        """
-        if not line:
-            return
+    return dict(AGENT_VARIABLE_PATTERN.findall(content))
 
-        user, pid = line.split()[:2]
 
-        if 'egrep' not in line and user == SETUP.username:
-            LOGGER.debug(f'Existing ssh-agent pid - {pid}')
-            LOGGER.debug(f'{line}')
+def agent_socket_alive(socket_path: str) -> bool:
+    """
+    Check whether an ssh-agent is listening on the socket
+    """
+    if not socket_path:
+        return False
 
-    command = 'ps aux'
-    ps_process = Popen(command.split(), stdout=PIPE)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as agent_socket:
+        agent_socket.settimeout(1)
+        try:
+            agent_socket.connect(socket_path)
+        except OSError:
+            return False
+    return True
 
-    command = 'egrep ssh-agent'
-    with Popen(command.split(), stdin=ps_process.stdout, stdout=PIPE) \
-            as process:
-        out, err = process.communicate()
-        grepped = process.returncode == 0
-        ps_process.communicate()
 
-        if err and not grepped:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to grep for the ssh-agent'
-                                            ' process', ForeGroundColor.RED))
-            sys.exit()
+def retrieve_running_agent() -> Dict[str, str]:
+    """
+    Retrieve the environment of a live ssh-agent, either from the current
+    environment or from the env file persisted by a previous run
+    """
+    if agent_socket_alive(os.environ.get('SSH_AUTH_SOCK')):
+        return {x: os.environ[x] for x in AGENT_VARIABLES if x in os.environ}
+
+    try:
+        with open(AGENT_ENV_FILE) as env_file:
+            environment = parse_agent_environment(env_file.read())
+    except OSError:
+        return {}
+
+    if agent_socket_alive(environment.get('SSH_AUTH_SOCK')):
+        return environment
+    return {}
+
+
+def start_ssh_agent():
+    """
+    Reuse the live ssh-agent or start one, exporting its socket to every
+    child process so ssh-add & git over SSH share the same agent
+    """
+    environment = retrieve_running_agent()
 
-        parsed_output = out.decode('utf-8').split('\n')
+    if environment:
+        os.environ.update(environment)
+        LOGGER.info(format_ansi_string('Reusing the running SSH-agent process',
+                                       ForeGroundColor.LIGHT_GREEN))
+        return
 
-    consume(map(lambda x: find_ssh_process(x), parsed_output))
+    for agent in find_processes('ssh-agent'):
+        LOGGER.debug(f'Stale ssh-agent pid - {agent.pid}')
 
-    command_list = ['sh', '-c', f'eval \"$(ssh-agent -s)\"']
-    with Popen(command_list, stdout=PIPE, stderr=PIPE) as process:
+    command = 'ssh-agent -s'
+    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
         out, err = process.communicate()
+        environment = parse_agent_environment(out.decode('utf-8'))
 
-        if err:
+        if err or 'SSH_AUTH_SOCK' not in environment:
             LOGGER.error(err.decode('utf-8'))
             LOGGER.error(format_ansi_string('SSH-agent process failed to '
                                             'start', ForeGroundColor.RED))
             sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('SSH-agent process has '
-                                           'successfully started',
-                                           ForeGroundColor.GREEN))
+
+    fs.makedirs(os.path.dirname(AGENT_ENV_FILE))
+    with open(os.open(AGENT_ENV_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                      0o600), 'w') as env_file:
+        env_file.write(out.decode('utf-8'))
+
+    os.environ.update(environment)
+    LOGGER.debug(out.decode('utf-8'))
+    LOGGER.info(format_ansi_string('SSH-agent process has successfully '
+                                   'started', ForeGroundColor.GREEN))
 
 
 def update_config_identity():
     """
     Update config file in .ssh directory
     """
-    ssh_config_file = f'{SETUP.directories.ssh}/config'
+    ssh_config = SshConfig(f'{SETUP.directories.ssh}/config')
+    block = ssh_config.find_block('*')
 
-    command = f'touch {ssh_config_file}'
-    call(command.split(), stdout=DEVNULL)
-
-    with open(ssh_config_file) as text_file:
-        content = ''.join(text_file.readlines())
-
-    pattern = re.compile(r'IdentityFile .*')
-    key_match = re.search(pattern, content)
-
-    identity_val = f'IdentityFile {SETUP.directories.ssh}/id_rsa'
-
-    if not key_match:
-        with open(ssh_config_file, 'a') as text_file:
-            text_file.write("Host *\n")
-            text_file.write("AddKeysToAgent yes\n")
-            text_file.write("UseKeychain yes\n")
-            text_file.write(identity_val)
-        LOGGER.info(format_ansi_string('IdentityFile key value appended to ssh'
-                                       ' config file', ForeGroundColor.GREEN))
-        return
-
-    start, end = key_match.span()
-    current_config = content[start: end]
-
-    if current_config == identity_val:
+    if block and PRIVATE_KEY in block.get('IdentityFile'):
         LOGGER.info(format_ansi_string('IdentityFile key value already '
                                        'configured in ssh config file',
                                        ForeGroundColor.LIGHT_GREEN))
         return
 
-    content = content[:start] + identity_val + content[end:]
-    with open(ssh_config_file, 'w') as text_file:
-        text_file.write(content)
+    if not block:
+        block = ssh_config.add_block('*')
+        block.set('AddKeysToAgent', 'yes')
+        block.set('UseKeychain', 'yes')
+
+    block.ensure('IdentityFile', PRIVATE_KEY)
+    ssh_config.save()
 
     LOGGER.info(format_ansi_string('IdentityFile key value updated in ssh '
                                    'config file', ForeGroundColor.GREEN))
@@ -162,7 +218,7 @@ def register_private_key_to_ssh_agent():
     LOGGER.info(format_ansi_string(f'Passphrase for the newly generated SSH key '
                                    f'to cache - {SETUP.ssh_passphrase}'))
 
-    command = f'ssh-add -K {SETUP.directories.ssh}/id_rsa'
+    command = f'ssh-add -K {PRIVATE_KEY}'
     ssh_added = call(command.split(), stdout=DEVNULL) == 0
 
     if ssh_added:
@@ -180,96 +236,78 @@ def get_public_key() -> str:
     """
     Return utf-8 string of ssh public key
     """
-    command = f'cat {SETUP.directories.ssh}/id_rsa.pub'
-    with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
-
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('SSH public key is missing',
-                                            ForeGroundColor.RED))
-            sys.exit()
+    try:
+        content = fs.read_text(PUBLIC_KEY)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string('SSH public key is missing',
+                                        ForeGroundColor.RED))
+        sys.exit()
 
-        LOGGER.debug(out.decode('utf-8'))
-        parsed_output = out.decode('utf-8').split()
-        key_type = parsed_output[0]
-        key_data = parsed_output[1]
+    LOGGER.debug(content)
+    key_type, key_data = content.split()[:2]
 
-        public_key = f'{key_type} {key_data}'
-        return public_key
+    public_key = f'{key_type} {key_data}'
+    return public_key
 
 
-def delete_ssh_rsa_keypair():
+def fingerprint_public_key(public_key: str) -> str:
     """
-    Delete both public and private key configured for ssh
+    Return the SHA256 fingerprint of the public key, formatted the same way as
+    'ssh-keygen -l' does, or an empty string if the key is malformed
     """
-    command_list = ['sh', '-c', f'rm {SETUP.directories.ssh}/id_rsa*']
+    try:
+        key_data = base64.b64decode(public_key.split()[1], validate=True)
+    except (IndexError, binascii.Error):
+        return ''
 
-    with Popen(command_list, stdout=PIPE, stderr=PIPE) as process:
-        out, err = process.communicate()
+    digest = base64.b64encode(hashlib.sha256(key_data).digest())
+    return f'SHA256:{digest.decode("utf-8").rstrip("=")}'
 
-        if err:
-            LOGGER.error(err.decode('utf-8'))
-            LOGGER.error(format_ansi_string('Failed to remove RSA keypairs '
-                                            'configured for SSH',
-                                            ForeGroundColor.RED))
-            sys.exit()
-        else:
-            LOGGER.debug(out.decode('utf-8'))
-            LOGGER.info(format_ansi_string('RSA keypairs configured for SSH '
-                                           'has successfully been removed',
-                                           ForeGroundColor.GREEN))
+
+def delete_ssh_keypair():
+    """
+    Delete both public and private key configured for ssh
+    """
+    try:
+        fs.remove(PRIVATE_KEY)
+        fs.remove(PUBLIC_KEY)
+        fs.remove(KEY_TYPE_FILE)
+    except fs.FileOperationError as fs_err:
+        LOGGER.error(str(fs_err))
+        LOGGER.error(format_ansi_string(f'Failed to remove '
+                                        f'{KEY_TYPE.upper()} keypairs '
+                                        f'configured for SSH',
+                                        ForeGroundColor.RED))
+        sys.exit()
+    else:
+        LOGGER.info(format_ansi_string(f'{KEY_TYPE.upper()} keypairs '
+                                       f'configured for SSH has '
+                                       f'successfully been removed',
+                                       ForeGroundColor.GREEN))
 
 
 def stop_ssh_agent():
     """
     Stop process responsible for ssh connections
-    TODO - refactor logic to functional later...
     """
-    command = 'ps aux'
-    ps_process = Popen(command.split(), stdout=PIPE)
+    pids_to_kill = [x.pid for x in find_processes('ssh-agent')]
 
-    command = 'egrep ssh-agent'
-    egrep_process = Popen(
-        command.split(), stdin=ps_process.stdout, stdout=PIPE)
+    try:
+        stopped_pids = signal_processes(pids_to_kill)
+    except OSError as os_err:
+        LOGGER.error(str(os_err))
+        LOGGER.error(format_ansi_string('Failed to stop ssh-agent process',
+                                        ForeGroundColor.RED))
+        sys.exit()
 
-    out, err = egrep_process.communicate()
-    grepped = egrep_process.returncode == 0
+    for pid in stopped_pids:
+        LOGGER.debug(f'SSH-agent pid {pid} has been terminated')
 
-    if err and not grepped:
-        LOGGER.error(err.decode('utf-8'))
-        LOGGER.error(format_ansi_string('Failed to grep', ForeGroundColor.RED))
-        sys.exit()
+    for variable in AGENT_VARIABLES:
+        os.environ.pop(variable, None)
 
-    ps_process.communicate()
-
-    pids_to_kill = []
-    parsed_output = out.decode('utf-8').split('\n')
-    for line in parsed_output:
-        if not line:
-            continue
-
-        user, pid = line.split()[:2]
-
-        if 'egrep' not in line and user == SETUP.username:
-            LOGGER.debug(f'Existing ssh-agent pid - {pid}')
-            LOGGER.debug(f'{line}')
-            pids_to_kill.append(pid)
-
-    for pid in pids_to_kill:
-        command = f'kill {pid}'
-        with Popen(command.split(), stdout=PIPE, stderr=PIPE) as process:
-            out, err = process.communicate()
-
-            if err:
-                LOGGER.error(err.decode('utf-8'))
-                LOGGER.error(format_ansi_string('Failed to stop ssh-agent '
-                                                'process',
-                                                ForeGroundColor.RED))
-                sys.exit()
-            else:
-                LOGGER.debug(out.decode('utf-8'))
-                LOGGER.debug('SSH-agent pid {pid} has been terminated')
+    fs.remove(AGENT_ENV_FILE)
 
     LOGGER.info(format_ansi_string('SSH-agent process has successfully been '
                                    'stopped', ForeGroundColor.GREEN))
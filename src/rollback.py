@@ -3,17 +3,18 @@ Script to automate  cleanup of developement environment
 """
 
 # Native Modules
+import asyncio
 import logging
 
 from lib import dotfiles, git, pip, powerline, ssh
-from singletons.github import GithubSingleton
+from singletons.github import AsyncGithubClient, GithubSingleton
 # Custom Modules
 from singletons.setup import SetupSingleton
 from utils.decorators import measure_time, print_process_step
 from utils.general import format_success_message
 
 SETUP = SetupSingleton.get_instance()
-GITHUB = GithubSingleton.get_instance()
+GITHUB = AsyncGithubClient(GithubSingleton.get_instance())
 LOGGER = logging.getLogger()
 
 
@@ -54,15 +55,30 @@ def uninstall_git_ssh():
         return
 
     current_public_key = ssh.get_public_key()
-    public_keys = GITHUB.get_public_keys().json()
 
-    git.delete_github_pub_key(current_public_key, public_keys)
-    ssh.delete_ssh_rsa_keypair()
+    git.delete_github_pub_key(current_public_key)
+    ssh.delete_ssh_keypair()
     ssh.stop_ssh_agent()
     git.remove_ssh_config()
     git.remove_ssh_github_host()
 
 
+async def run_cleanup_processes():
+    """
+    Runs the following cleanup processes in order, where the GitHub public
+    keys are listed while the local configurations are removed
+    """
+    loop = asyncio.get_running_loop()
+
+    public_keys = asyncio.ensure_future(GITHUB.get_public_keys())
+    await loop.run_in_executor(None, uninstall_pip)
+    await loop.run_in_executor(None, uninstall_powerline)
+    await loop.run_in_executor(None, uninstall_dotfiles)
+    await public_keys
+
+    uninstall_git_ssh()
+
+
 if __name__ == '__main__':
     @measure_time
     def clean_dev_environment():
@@ -70,9 +86,6 @@ if __name__ == '__main__':
         Cleans up the development environment that was automatically setup
         previously
         """
-        uninstall_pip()
-        uninstall_powerline()
-        uninstall_dotfiles()
-        uninstall_git_ssh()
+        asyncio.run(run_cleanup_processes())
 
     clean_dev_environment()
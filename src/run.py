@@ -4,13 +4,17 @@ tools & software
 """
 
 # Native Modules
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Custom Modules
 from lib import brew, dotfiles, git, pip, powerline, ssh
+from singletons.github import AsyncGithubClient, GithubSingleton
 from utils.decorators import measure_time, print_process_step
 from utils.general import format_success_message
 
+GITHUB = AsyncGithubClient(GithubSingleton.get_instance())
 LOGGER = logging.getLogger()
 
 
@@ -19,8 +23,7 @@ def configure_brew():
     """
     Installs all configured system & application packages
     """
-    brew.install_all_brew_packages()
-    brew.install_all_cask_packages()
+    brew.install_all_packages()
 
 
 @print_process_step(step_no=2, title='Configuring SSH keys...')
@@ -29,16 +32,16 @@ def configure_ssh_keys():
     Configure a new ssh key for the user
     """
     if ssh.public_key_exists():
+        ssh.start_ssh_agent()
         LOGGER.info(format_success_message('SSH keys are already configured!'))
         return
 
-    ssh.generate_rsa_keypair()
+    ssh.generate_ssh_keypair()
     ssh.start_ssh_agent()
     ssh.update_config_identity()
     ssh.register_private_key_to_ssh_agent()
 
 
-@print_process_step(step_no=3, title='Configuring Github SSH connection...')
 def configure_github_connection():
     """
     Configure the user's SSH key to their own Github account
@@ -51,6 +54,29 @@ def configure_github_connection():
     git.upload_ssh_key_to_github()
 
 
+def configure_pip():
+    """
+    Installs pip & all configured packages
+    """
+    pip.install_all_pip_packages_at_user()
+
+
+@print_process_step(step_no=3, title='Configuring Github SSH connection & PIP '
+                                     'packages...')
+def configure_github_connection_and_pip():
+    """
+    Configures the GitHub SSH connection while the pip packages install. When
+    either exits, the other is awaited before the exit is raised so nothing
+    keeps running in the background
+    """
+    with ThreadPoolExecutor(2) as executor:
+        steps = [executor.submit(configure_github_connection),
+                 executor.submit(configure_pip)]
+
+    for step in steps:
+        step.result()
+
+
 @print_process_step(step_no=4, title='Configuring dotfiles from GitHub...')
 def configure_dotfiles():
     """
@@ -68,15 +94,7 @@ def configure_dotfiles():
     dotfiles.configure_emacs()
 
 
-@print_process_step(step_no=5, title='Configuring PIP packages...')
-def configure_pip():
-    """
-    Installs pip & all configured packages
-    """
-    pip.install_all_pip_packages_at_user()
-
-
-@print_process_step(step_no=6, title='Configuring powerline for terminal...')
+@print_process_step(step_no=5, title='Configuring powerline for terminal...')
 def configure_powerline():
     """
     Configures powerline for the terminal emulator via PIP
@@ -89,17 +107,33 @@ def configure_powerline():
     powerline.config_git_shell()
 
 
+async def run_installation_processes():
+    """
+    Runs the following installation processes in order, where the GitHub
+    account is probed for its public keys & dotfiles repository while the
+    brew packages install, which decides steps 3 & 4 before any SSH traffic
+    """
+    loop = asyncio.get_running_loop()
+
+    account_probe = asyncio.ensure_future(GITHUB.probe_account())
+    await loop.run_in_executor(None, configure_brew)
+    await account_probe
+
+    configure_ssh_keys()
+
+    configure_github_connection_and_pip()
+
+    configure_dotfiles()
+    configure_powerline()
+
+
 if __name__ == '__main__':
     @measure_time
     def build_dev_environment():
         """
-        Runs the following installation processes in sequential order
+        Runs the installation processes with GitHub requests overlapping the
+        package installations
         """
-        configure_brew()
-        configure_ssh_keys()
-        configure_github_connection()
-        configure_dotfiles()
-        configure_pip()
-        configure_powerline()
+        asyncio.run(run_installation_processes())
 
     build_dev_environment()
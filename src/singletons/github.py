@@ -3,18 +3,75 @@ Singleton object for setup script regarding Github
 """
 
 # Native Modules
+import asyncio
+import collections
+import datetime
+import email.utils
+import functools
 import logging
 import pprint
+import random
 import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator
 
 # Third Party Modules
 import requests
+from requests.adapters import HTTPAdapter
 # Custom Modules
+from singletons.setup import SetupSingleton
+from utils.cache import MetadataCache
 from utils.general import format_ansi_string, format_success_message
 from utils.unicode import ForeGroundColor
 
+RateLimit = collections.namedtuple('RateLimit', ['limit', 'remaining',
+                                                 'reset'])
+AccountProbe = collections.namedtuple('AccountProbe', ['dotfiles_exists',
+                                                       'dotfiles_head',
+                                                       'public_keys',
+                                                       'private_visible'])
+CachedResponse = collections.namedtuple('CachedResponse', ['body',
+                                                           'next_url'])
+
+SETUP = SetupSingleton.get_instance()
 LOGGER = logging.getLogger()
 
+VALIDATOR_TTL = 30 * 24 * 60 * 60
+VALIDATOR_CACHE_SIZE = 100
+ACCOUNT_PROBE_QUERY = """
+query($login: String!, $cursor: String) {
+  user(login: $login) {
+    repository(name: "dotfiles") {
+      defaultBranchRef {
+        name
+        target {
+          oid
+        }
+      }
+    }
+    publicKeys(first: 100, after: $cursor) {
+      nodes {
+        key
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+    }
+  }
+}
+"""
+PAGE_SIZE = 100
+POOL_SIZE = 10
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_STATUSES = {403, 429}
+RETRY_BACKOFF = 0.5
+RETRY_BACKOFF_MAX = 30
+RATE_LIMIT_RETRIES = 3
+
 
 class GithubSingleton:
     """
@@ -27,7 +84,7 @@ class GithubSingleton:
         """ Initialise the singleton"""
         git = read_git_credentials()
 
-        self.api = 'https://api.github.com'
+        self.api = SETUP.settings.github_api
         self.username = git['username']
         self.email = git['email']
         self.token = git['token']
@@ -35,6 +92,28 @@ class GithubSingleton:
         self.common_headers = {}
         self.common_headers['Authorization'] = f'token {self.token}'
 
+        settings = SETUP.settings
+        self.timeout = (settings.github_connect_timeout,
+                        settings.github_read_timeout)
+        self.retries = settings.github_retries
+
+        self.session = requests.Session()
+        self.session.headers['Accept'] = 'application/vnd.github.v3+json'
+        self.session.headers.update(self.common_headers)
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=POOL_SIZE))
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=POOL_SIZE))
+
+        self.rate_limit = None
+        self.rate_limit_lock = threading.Lock()
+
+        self.cache_lock = threading.Lock()
+        self.in_flight = {}
+        self.responses = {}
+        self.account_probe = None
+        self.validators = MetadataCache(
+            f'{SETUP.directories.cache}/github/responses.json',
+            VALIDATOR_TTL, VALIDATOR_CACHE_SIZE)
+
     def __init__(self):
         """ Virtually private constructor """
         if GithubSingleton.__instance:
@@ -46,26 +125,311 @@ class GithubSingleton:
         LOGGER.debug(f'GithubSingleton:\n {self}')
 
     def __str__(self):
-        return pprint.pformat(self.__dict__)
+        object_copy = dict(self.__dict__)
+        object_copy.pop('session')
+        object_copy.pop('rate_limit_lock')
+        object_copy.pop('cache_lock')
+        object_copy.pop('in_flight')
+        object_copy.pop('responses')
+        object_copy.pop('account_probe')
+        object_copy.pop('validators')
+        return pprint.pformat(object_copy)
 
-    def get_public_keys(self) -> dict:
+    def rate_limit_delay(self) -> float:
         """
-        Retrieve list of existing public keys for configured user
+        Returns the seconds left until the rate limit window resets
+        """
+        with self.rate_limit_lock:
+            budget = self.rate_limit
+            return budget.reset - time.time() + 1 if budget else 0
+
+    def reserve_rate_limit(self):
+        """
+        Waits for the rate limit window to reset when the budget shared by
+        every caller is exhausted
+        """
+        while True:
+            with self.rate_limit_lock:
+                budget = self.rate_limit
+                delay = budget.reset - time.time() + 1 if budget else 0
+
+                if not budget or budget.remaining > 0 or delay <= 0:
+                    return
+
+            LOGGER.info(format_ansi_string(f'GitHub API rate limit exhausted,'
+                                           f' waiting {delay:.0f}s for it to '
+                                           f'reset', ForeGroundColor.YELLOW))
+            time.sleep(delay)
+
+    def update_rate_limit(self, res: requests.Response) -> bool:
+        """
+        Updates the shared rate limit budget from the 'X-RateLimit-*' headers
+        of the response, or deducts the request from it when they're missing,
+        returning whether the request was rate limited. A '304 Not Modified'
+        response isn't counted by GitHub so it's never deducted
+        """
+        try:
+            limit = int(res.headers['X-RateLimit-Limit'])
+            remaining = int(res.headers['X-RateLimit-Remaining'])
+            reset = int(res.headers['X-RateLimit-Reset'])
+        except (KeyError, ValueError):
+            with self.rate_limit_lock:
+                budget = self.rate_limit
+                if budget and budget.remaining > 0 and \
+                        res.status_code != 304:
+                    self.rate_limit = budget._replace(
+                        remaining=budget.remaining - 1)
+            return False
+
+        with self.rate_limit_lock:
+            budget = self.rate_limit
+            if not budget or reset > budget.reset:
+                self.rate_limit = RateLimit(limit, remaining, reset)
+            elif remaining < budget.remaining:
+                self.rate_limit = budget._replace(remaining=remaining)
+
+        return remaining == 0 and res.status_code in RATE_LIMIT_STATUSES
+
+    def request(self, method: str, url: str, idempotent: bool = None,
+                **kwargs) -> requests.Response:
+        """
+        Sends the request through the pooled session. Timeouts, connection
+        errors & transient server errors are retried with exponential backoff
+        & full jitter, although a non idempotent request is only retried when
+        it never reached the server. Rate limited requests wait for the rate
+        limit window to reset, at least for the backoff in case the local
+        clock is ahead, & are retried up to RATE_LIMIT_RETRIES times without
+        counting as an attempt
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        rate_limited = 0
+
+        while True:
+            final_attempt = attempt == self.retries
+            self.reserve_rate_limit()
+
+            try:
+                res = self.session.request(method, url, timeout=self.timeout,
+                                           **kwargs)
+            except requests.ConnectTimeout as req_err:
+                if final_attempt:
+                    raise
+                reason, retry_after = req_err, 0
+            except (requests.ConnectionError, requests.Timeout) as req_err:
+                if final_attempt or not idempotent:
+                    raise
+                reason, retry_after = req_err, 0
+            else:
+                if self.update_rate_limit(res):
+                    if rate_limited == RATE_LIMIT_RETRIES:
+                        res.raise_for_status()
+                    rate_limited += 1
+
+                    backoff = min(RETRY_BACKOFF * 2 ** rate_limited,
+                                  RETRY_BACKOFF_MAX)
+                    delay = max(self.rate_limit_delay(), backoff)
+
+                    LOGGER.debug(f'{method} {url} - rate limited, retrying in '
+                                 f'{delay:.2f}s (rate limit retry '
+                                 f'{rate_limited})')
+                    time.sleep(delay)
+                    continue
+                if final_attempt or not idempotent or \
+                        res.status_code not in RETRY_STATUSES:
+                    res.raise_for_status()
+                    return res
+                reason = f'{res.status_code} {res.reason}'
+                retry_after = parse_retry_after(res.headers.get('Retry-After'))
+
+            backoff = min(RETRY_BACKOFF * 2 ** attempt, RETRY_BACKOFF_MAX)
+            delay = max(random.uniform(0, backoff), retry_after)
+            attempt += 1
+
+            LOGGER.debug(f'Retrying {method} {url} in {delay:.2f}s '
+                         f'(attempt {attempt}) - {reason}')
+            time.sleep(delay)
+
+    def get_cached(self, url: str) -> CachedResponse:
+        """
+        Retrieves the JSON body of the url along with the url of its next
+        page, memoized for the rest of the run. Identical requests in flight
+        at the same time are coalesced into a single request
+        """
+        with self.cache_lock:
+            if url in self.responses:
+                return self.responses[url]
+
+            in_flight = self.in_flight.get(url)
+            if not in_flight:
+                self.in_flight[url] = future = Future()
+
+        if in_flight:
+            LOGGER.debug(f'GET {url} - coalesced with the request in flight')
+            return in_flight.result()
+
+        try:
+            response = self.fetch_cached(url)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self.cache_lock:
+                self.in_flight.pop(url)
+
+    def fetch_cached(self, url: str) -> CachedResponse:
+        """
+        Requests the url conditionally, the ETag & Last-Modified validators of
+        the last response are persisted across runs, where a '304 Not
+        Modified' response is served from the cached body & doesn't count
+        against the rate limit
+        """
+        cached = self.validators.get(url) or {}
+        headers = {}
+
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        res = self.request('GET', url, headers=headers)
+
+        if res.status_code == 304 and cached:
+            LOGGER.debug(f'GET {url} - not modified, serving cached body')
+            response = CachedResponse(cached['body'], cached.get('next'))
+        else:
+            response = CachedResponse(res.json(),
+                                      res.links.get('next', {}).get('url'))
+
+        with self.cache_lock:
+            self.validators.put(url, {
+                'etag': res.headers.get('ETag') or cached.get('etag'),
+                'last_modified': res.headers.get('Last-Modified') or
+                                 cached.get('last_modified'),
+                'body': response.body,
+                'next': response.next_url
+            })
+            self.validators.save()
+
+            self.responses[url] = response
+        return response
+
+    def get_cached_pages(self, url: str) -> Iterator[Any]:
+        """
+        Streams every item of a paginated listing, following the next page
+        links of each response
+        """
+        next_url = f'{url}?per_page={PAGE_SIZE}'
+
+        while next_url:
+            response = self.get_cached(next_url)
+            yield from response.body
+            next_url = response.next_url
+
+    def invalidate_cached(self, url: str):
+        """
+        Discards the memoized body of every page of the url & the account
+        probe, the persisted validators are kept as the next conditional
+        request detects the change itself
+        """
+        with self.cache_lock:
+            self.account_probe = None
+            for cached_url in [x for x in self.responses
+                               if x.startswith(url)]:
+                self.responses.pop(cached_url)
+
+    def iterate_public_keys(self) -> Iterator[dict]:
+        """
+        Streams every existing public key across all pages for configured user
         """
         url = f'{self.api}/users/{self.username}/keys'
 
         try:
-            res = requests.get(url, timeout=3)
-            res.raise_for_status()
+            yield from self.get_cached_pages(url)
         except requests.RequestException as req_err:
-            LOGGER.error(f'Request Error occurred: {req_err}')
-            LOGGER.error(f'Returned response: {res.json()}')
-            LOGGER.error(format_ansi_string('Failed request to GitHub API to '
-                                            'get public keys',
-                                            ForeGroundColor.RED))
+            log_request_error(req_err, 'get public keys')
             sys.exit()
-        else:
-            return res
+
+    def public_keys_cached(self) -> bool:
+        """
+        Check whether the public keys were already listed during the run, so
+        iterating them again is served from memory
+        """
+        url = f'{self.api}/users/{self.username}/keys?per_page={PAGE_SIZE}'
+
+        with self.cache_lock:
+            return url in self.responses
+
+    def get_public_keys(self) -> list:
+        """
+        Retrieve list of existing public keys for configured user
+        """
+        return list(self.iterate_public_keys())
+
+    def probe_account(self) -> AccountProbe:
+        """
+        Probes in a single GraphQL round trip whether the user has a
+        'dotfiles' repository, the head of its default branch & the public
+        keys of the user, memoized for the rest of the run. Whether private
+        repositories are visible at all is read from the 'repo' scope of the
+        token in the 'X-OAuth-Scopes' header. Returns None if the probe failed
+        so callers can fall back to other means
+        """
+        with self.cache_lock:
+            if self.account_probe:
+                return self.account_probe
+
+        public_keys = []
+        cursor = None
+
+        try:
+            while True:
+                payload = {
+                    'query': ACCOUNT_PROBE_QUERY,
+                    'variables': {'login': self.username, 'cursor': cursor}
+                }
+                res = self.request('POST', f'{self.api}/graphql',
+                                   idempotent=True, json=payload)
+                data = res.json()
+                scopes = {x.strip() for x in
+                          res.headers.get('X-OAuth-Scopes', '').split(',')}
+
+                errors = [x for x in data.get('errors', [])
+                          if x.get('type') != 'NOT_FOUND']
+                if errors or not (data.get('data') or {}).get('user'):
+                    LOGGER.warning(f'GraphQL errors: {errors}')
+                    return None
+
+                user = data['data']['user']
+                public_keys.extend(x['key']
+                                   for x in user['publicKeys']['nodes'])
+
+                page_info = user['publicKeys']['pageInfo']
+                if not page_info['hasNextPage']:
+                    break
+                cursor = page_info['endCursor']
+        except (requests.RequestException, ValueError) as req_err:
+            LOGGER.warning(f'Request Error occurred: {req_err}')
+            LOGGER.warning(format_ansi_string('Failed to probe the GitHub '
+                                              'account through GraphQL',
+                                              ForeGroundColor.YELLOW))
+            return None
+
+        repository = user['repository']
+        branch = (repository or {}).get('defaultBranchRef') or {}
+        probe = AccountProbe(repository is not None,
+                             (branch.get('target') or {}).get('oid'),
+                             public_keys, 'repo' in scopes)
+
+        LOGGER.debug(f'GitHub account probe - {probe}')
+
+        with self.cache_lock:
+            self.account_probe = probe
+        return probe
 
     def create_public_key(self, payload: dict):
         """
@@ -74,18 +438,12 @@ class GithubSingleton:
         url = f'{self.api}/user/keys'
 
         try:
-            res = requests.post(
-                url, json=payload, headers=self.common_headers, timeout=3
-            )
-            res.raise_for_status()
+            res = self.request('POST', url, json=payload)
         except requests.RequestException as req_err:
-            LOGGER.error(f'Request Error occurred: {req_err}')
-            LOGGER.error(f'Returned response: {res.json()}')
-            LOGGER.error(format_ansi_string('Failed request to GitHub API to '
-                                            'create a public key',
-                                            ForeGroundColor.RED))
+            log_request_error(req_err, 'create a public key')
             sys.exit()
         else:
+            self.invalidate_cached(f'{self.api}/users/{self.username}/keys')
             LOGGER.info(format_success_message(
                 'Github public key has successfully been created!'))
             return res
@@ -97,16 +455,12 @@ class GithubSingleton:
         url = f'{self.api}/user/keys/{key_id}'
 
         try:
-            res = requests.delete(url, headers=self.common_headers, timeout=3)
-            res.raise_for_status()
+            res = self.request('DELETE', url)
         except requests.RequestException as req_err:
-            LOGGER.error(f'Request Error occurred: {req_err}')
-            LOGGER.error(f'Returned response: {res.json()}')
-            LOGGER.error(format_ansi_string('Failed request to GitHub API to '
-                                            'delete a public key',
-                                            ForeGroundColor.RED))
+            log_request_error(req_err, 'delete a public key')
             sys.exit()
         else:
+            self.invalidate_cached(f'{self.api}/users/{self.username}/keys')
             return res
 
     @staticmethod
@@ -117,6 +471,88 @@ class GithubSingleton:
         return GithubSingleton.__instance
 
 
+class AsyncGithubClient:
+    """
+    Asyncio interface over the GithubSingleton, where every call is awaitable
+    so GitHub requests can be issued concurrently with each other & with
+    subprocess heavy steps driven from the event loop. The blocking requests
+    run on a dedicated thread pool sharing the singleton's pooled session,
+    retries & response cache
+    """
+
+    def __init__(self, github: GithubSingleton, max_workers: int = POOL_SIZE):
+        self.github = github
+        self.executor = ThreadPoolExecutor(max_workers)
+
+    async def run(self, function: Callable, *args) -> Any:
+        """
+        Runs the blocking function on the client's thread pool
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          functools.partial(function, *args))
+
+    async def get_public_keys(self) -> list:
+        """
+        Retrieve list of existing public keys for configured user
+        """
+        return await self.run(self.github.get_public_keys)
+
+    async def probe_account(self) -> AccountProbe:
+        """
+        Probes the dotfiles repository & public keys of the user
+        """
+        return await self.run(self.github.probe_account)
+
+    async def create_public_key(self, payload: dict) -> requests.Response:
+        """
+        Create public key given input to github user account
+        """
+        return await self.run(self.github.create_public_key, payload)
+
+    async def delete_public_key(self, key_id: int) -> requests.Response:
+        """
+        Delete given public key from github user account
+        """
+        return await self.run(self.github.delete_public_key, key_id)
+
+
+def parse_retry_after(value: str) -> float:
+    """
+    Parses the 'Retry-After' header, which is either a number of seconds or
+    an HTTP-date, into the seconds to wait. A missing or malformed header
+    waits for nothing so the computed backoff applies
+    """
+    if not value:
+        return 0
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0
+
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+    return max(retry_date.timestamp() - time.time(), 0)
+
+
+def log_request_error(req_err: requests.RequestException, action: str):
+    """
+    Logs the failed request to the GitHub API along with the response returned
+    if the request ever received one
+    """
+    LOGGER.error(f'Request Error occurred: {req_err}')
+    if req_err.response is not None:
+        LOGGER.error(f'Returned response: {req_err.response.text}')
+    LOGGER.error(format_ansi_string(f'Failed request to GitHub API to '
+                                    f'{action}', ForeGroundColor.RED))
+
+
 def read_git_credentials() -> dict:
     """
     Read credentials from file into wrapper object from project directory
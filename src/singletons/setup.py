@@ -12,9 +12,11 @@ import pprint
 import re
 import sys
 import traceback
-from subprocess import DEVNULL, call, check_output
+from subprocess import check_output
+from typing import Any, Callable, Tuple
 
 # Custom Modules
+from utils import fs
 from utils.general import format_ansi_string, random_string
 from utils.unicode import ForeGroundColor, Format, Symbols
 
@@ -22,10 +24,25 @@ LOGGER = logging.getLogger()
 
 Directories = collections.namedtuple("Directories", ['home', 'brew', 'dotfiles',
                                                      'emacs', 'python_site',
-                                                     'powerline', 'ssh'])
-
-Files = collections.namedtuple('Files', ['brew', 'cask', 'pip', 'git', 'bash',
-                                         'vim', 'emacs'])
+                                                     'powerline', 'ssh',
+                                                     'cache', 'logs'])
+
+Files = collections.namedtuple('Files', ['brew', 'cask', 'pip', 'pip_lock',
+                                         'git', 'bash', 'vim', 'emacs'])
+
+Settings = collections.namedtuple('Settings', ['brew_workers',
+                                               'brew_cache_ttl',
+                                               'brew_cache_size',
+                                               'brew_batch',
+                                               'pip_wheelhouse',
+                                               'github_connect_timeout',
+                                               'github_read_timeout',
+                                               'github_retries',
+                                               'github_api',
+                                               'ssh_key_type',
+                                               'dotfiles_clone',
+                                               'dotfiles_sync',
+                                               'dotfiles_deploy'])
 
 
 class SetupSingleton:
@@ -48,6 +65,7 @@ class SetupSingleton:
         self.directories: Directories = retrieve_directories()
         self.files: Files = retrieve_files(
             self.directories.home, self.entry_point)
+        self.settings: Settings = retrieve_settings()
 
         LOGGER.info(format_ansi_string('Ensure you\'ve configured the '
                                        'following files before proceeding: ',
@@ -73,8 +91,10 @@ class SetupSingleton:
         object_copy = copy.deepcopy(self.__dict__)
         object_copy.pop('directories')
         object_copy.pop('files')
+        object_copy.pop('settings')
         object_copy['directories'] = self.directories._asdict()
         object_copy['files'] = self.files._asdict()
+        object_copy['settings'] = self.settings._asdict()
         return pprint.pformat(object_copy)
 
     @staticmethod
@@ -117,8 +137,7 @@ def initialise_logger():
 
     log_dir = f'logs/{get_entry_point()}'
 
-    command = f'mkdir -p {log_dir}'
-    call(command.split(), stdout=DEVNULL)
+    fs.makedirs(log_dir)
 
     out_path = f'{log_dir}/out.log'
     err_path = f'{log_dir}/err.log'
@@ -180,8 +199,11 @@ def retrieve_directories() -> Directories:
 
     powerline = f'{home}/.config/powerline'
     ssh = f'{home}/.ssh'
+    cache = 'cache'
+    logs = f'logs/{get_entry_point()}'
 
-    return Directories(home, brew, dotfiles, emacs, python_site, powerline, ssh)
+    return Directories(home, brew, dotfiles, emacs, python_site, powerline,
+                       ssh, cache, logs)
 
 
 def retrieve_files(home: str, entry_point: str) -> Files:
@@ -199,9 +221,80 @@ def retrieve_files(home: str, entry_point: str) -> Files:
         cask = 'config/brew/casks'
         pip = 'config/pip/leaves'
 
+    pip_lock = f'{pip}.lock'
     git = 'config/git-credentials.txt'
     bash = f'{home}/.bash_profile'
     vim = f'{home}/.vimrc'
     emacs = f'{home}/.emacs.d/init.el'
 
-    return Files(brew, cask, pip, git, bash, vim, emacs)
+    return Files(brew, cask, pip, pip_lock, git, bash, vim, emacs)
+
+
+def get_argument(name: str, default: Any, cast: Callable = str) -> Any:
+    """
+    Retrieves the value of an optional '--<name>=<value>' flag passed to the
+    script, otherwise the default is returned
+    """
+    prefix = f'--{name}='
+    value = next((x[len(prefix):] for x in sys.argv if x.startswith(prefix)),
+                 None)
+
+    if value is None:
+        return default
+
+    try:
+        return cast(value)
+    except ValueError:
+        LOGGER.error(format_ansi_string(f'Invalid value for --{name} - '
+                                        f'{value}', ForeGroundColor.RED))
+        sys.exit()
+
+
+def get_choice(name: str, choices: Tuple[str, ...],
+               optional: bool = False) -> str:
+    """
+    Retrieves the value of an optional '--<name>=<value>' flag restricted to
+    the choices, where the first choice is the default unless the flag is
+    optional, in which case None is returned when it's not passed
+    """
+    value = get_argument(name, None if optional else choices[0])
+
+    if value is None:
+        return value
+
+    if value not in choices:
+        LOGGER.error(format_ansi_string(f'Invalid value for --{name} - '
+                                        f'{value} (expected one of '
+                                        f'{", ".join(choices)})',
+                                        ForeGroundColor.RED))
+        sys.exit()
+
+    return value
+
+
+def retrieve_settings() -> Settings:
+    """
+    Retrieves tunable settings for the setup from the flags passed in
+    """
+    brew_workers = max(get_argument('brew-workers', 4, int), 1)
+    brew_cache_ttl = get_argument('brew-cache-ttl', 24 * 60 * 60, int)
+    brew_cache_size = get_argument('brew-cache-size', 1000, int)
+    brew_batch = '--brew-batch' in sys.argv
+    pip_wheelhouse = '--pip-wheelhouse' in sys.argv
+    github_connect_timeout = get_argument('github-connect-timeout', 3.05,
+                                          float)
+    github_read_timeout = get_argument('github-read-timeout', 10, float)
+    github_retries = max(get_argument('github-retries', 3, int), 0)
+    github_api = get_argument('github-api', 'https://api.github.com')
+    ssh_key_type = get_choice('ssh-key-type', ('rsa', 'ed25519'),
+                              optional=True)
+    dotfiles_clone = get_choice('dotfiles-clone', ('full', 'sparse'))
+    dotfiles_sync = '--dotfiles-sync' in sys.argv
+    dotfiles_deploy = get_choice('dotfiles-deploy',
+                                 ('copy', 'symlink', 'hardlink'))
+
+    return Settings(brew_workers, brew_cache_ttl, brew_cache_size, brew_batch,
+                    pip_wheelhouse, github_connect_timeout,
+                    github_read_timeout, github_retries,
+                    github_api.rstrip('/'), ssh_key_type, dotfiles_clone,
+                    dotfiles_sync, dotfiles_deploy)
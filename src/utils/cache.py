@@ -0,0 +1,75 @@
+"""
+Module holding the persistent cache for metadata between runs
+"""
+
+# Native Modules
+import json
+import time
+from typing import Any
+
+# Custom Modules
+from utils import fs
+
+
+class MetadataCache:
+    """
+    JSON file backed cache of metadata keyed by name. Entries expire once they
+    are older than the ttl (in seconds) & the oldest entries are evicted when
+    the cache grows beyond its maximum size
+    """
+
+    def __init__(self, path: str, ttl: int, max_size: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.modified = False
+
+        try:
+            with open(path) as json_file:
+                self.entries = json.load(json_file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Returns the cached value for the key if it's present & not expired
+        """
+        entry = self.entries.get(key)
+
+        if not entry or time.time() - entry['timestamp'] > self.ttl:
+            return default
+        return entry['value']
+
+    def put(self, key: str, value: Any):
+        """
+        Stores the value for the key, refreshing its timestamp
+        """
+        self.entries[key] = {'timestamp': time.time(), 'value': value}
+        self.modified = True
+
+    def evict(self):
+        """
+        Removes expired entries & the oldest entries beyond the maximum size
+        """
+        now = time.time()
+        live = {key: entry for key, entry in self.entries.items()
+                if now - entry['timestamp'] <= self.ttl}
+        newest = sorted(live.items(), key=lambda x: x[1]['timestamp'],
+                        reverse=True)[:max(self.max_size, 0)]
+
+        if len(newest) != len(self.entries):
+            self.entries = dict(newest)
+            self.modified = True
+
+    def save(self):
+        """
+        Evicts & writes the cache to disk if anything has changed, atomically
+        so an interrupted write never corrupts the cache
+        """
+        self.evict()
+
+        if not self.modified:
+            return
+
+        fs.atomic_write(self.path, json.dumps(self.entries))
+        self.modified = False
@@ -0,0 +1,247 @@
+"""
+Module holding helper methods for filesystem operations
+"""
+
+# Native Modules
+import contextlib
+import errno
+import functools
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+from typing import IO, Callable, Iterator
+
+# Errors meaning the kernel can't copy between the two files in-kernel, so the
+# copy falls back to a userspace loop
+UNSUPPORTED_COPY_ERRORS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                           errno.EBADF, errno.ENOTSUP, errno.EOPNOTSUPP,
+                           errno.ENOTSOCK)
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class FileOperationError(Exception):
+    """
+    Error raised by any filesystem operation, holding the operation, the path
+    & the underlying OS error
+    """
+
+    def __init__(self, operation: str, path: str, error: OSError):
+        self.operation = operation
+        self.path = path
+        self.error = error
+        super().__init__(f'Failed to {operation} {path} - '
+                         f'{error.strerror or error}')
+
+
+def file_operation(operation: str) -> Callable:
+    """
+    Decorator converting the OS errors of a filesystem operation on the path
+    passed in first into a FileOperationError
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(path: str, *args, **kwargs):
+            try:
+                return function(path, *args, **kwargs)
+            except FileOperationError:
+                raise
+            except OSError as os_err:
+                raise FileOperationError(operation, path, os_err) from os_err
+        return wrapper
+    return decorator
+
+
+def exists(path: str) -> bool:
+    """
+    Check whether anything exists at the path, including broken symlinks
+    """
+    return os.path.lexists(path)
+
+
+@file_operation('read')
+def read_text(path: str) -> str:
+    """
+    Returns the contents of the text file
+    """
+    with open(path) as text_file:
+        return text_file.read()
+
+
+@file_operation('hash')
+def hash_file(path: str) -> str:
+    """
+    Returns the sha256 digest of the file's content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as binary_file:
+        for chunk in iter(lambda: binary_file.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@file_operation('create the directory')
+def makedirs(path: str):
+    """
+    Creates the directory along with any missing parents
+    """
+    os.makedirs(path, exist_ok=True)
+
+
+def copy_in_kernel(source_fd: int, destination_fd: int, size: int) -> bool:
+    """
+    Copies the file through copy_file_range or sendfile without moving the
+    data through userspace, returning False if neither is supported for the
+    pair of files or neither copies anything of a non-empty file, which some
+    filesystems & pseudo-files report instead of an error
+    """
+    for copy_function in (getattr(os, 'copy_file_range', None),
+                          getattr(os, 'sendfile', None)):
+        if not copy_function:
+            continue
+
+        offset = 0
+        try:
+            while offset < size:
+                if copy_function is os.sendfile:
+                    copied = os.sendfile(destination_fd, source_fd, offset,
+                                         size - offset)
+                else:
+                    copied = copy_function(source_fd, destination_fd,
+                                           size - offset)
+                if not copied:
+                    break
+                offset += copied
+        except OSError as os_err:
+            if offset or os_err.errno not in UNSUPPORTED_COPY_ERRORS:
+                raise
+            continue
+
+        if offset or not size:
+            return True
+    return False
+
+
+@file_operation('copy')
+def copy_file(source: str, destination: str) -> str:
+    """
+    Copies the file along with its permissions, through the in-kernel fast
+    path where the platform supports it
+    """
+    with open(source, 'rb') as source_file, \
+            open(destination, 'wb') as destination_file:
+        size = os.fstat(source_file.fileno()).st_size
+
+        if not copy_in_kernel(source_file.fileno(),
+                              destination_file.fileno(), size):
+            shutil.copyfileobj(source_file, destination_file,
+                               COPY_CHUNK_SIZE)
+
+    shutil.copymode(source, destination)
+    return destination
+
+
+@file_operation('copy the directory')
+def copy_tree(source: str, destination: str):
+    """
+    Copies the contents of the source directory into the destination, merging
+    with anything already there
+    """
+    shutil.copytree(source, destination, copy_function=copy_file,
+                    dirs_exist_ok=True)
+
+
+def replace_with_link(link: Callable, source: str, destination: str):
+    """
+    Creates the link under a temporary name next to the destination & renames
+    it over the destination, so the destination is never missing
+    """
+    temporary_path = f'{destination}.{os.getpid()}.tmp'
+    link(source, temporary_path)
+    try:
+        os.replace(temporary_path, destination)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_path)
+        raise
+
+
+@file_operation('symlink')
+def symlink(source: str, destination: str):
+    """
+    Atomically points the destination at the source through a symlink
+    """
+    replace_with_link(os.symlink, os.path.abspath(source), destination)
+
+
+@file_operation('hardlink')
+def hardlink(source: str, destination: str):
+    """
+    Atomically replaces the destination with a hardlink to the source, which
+    must be on the same filesystem
+    """
+    replace_with_link(os.link, source, destination)
+
+
+@file_operation('move')
+def move(source: str, destination: str):
+    """
+    Renames the source to the destination, replacing it if it exists
+    """
+    os.replace(source, destination)
+
+
+@file_operation('remove')
+def remove(path: str):
+    """
+    Removes the file or symlink, ignoring it if it's already missing
+    """
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+@file_operation('remove the directory')
+def remove_tree(path: str):
+    """
+    Removes the directory & everything within it, ignoring it if it's already
+    missing
+    """
+    with contextlib.suppress(FileNotFoundError):
+        shutil.rmtree(path)
+
+
+@contextlib.contextmanager
+def atomic_open(path: str, mode: str = 'w') -> Iterator[IO]:
+    """
+    Yields a temporary file next to the path, which atomically replaces the
+    path keeping its permissions once the block exits. The path is left
+    untouched if the block raises
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    descriptor, temporary_path = tempfile.mkstemp(
+        dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, mode) as temporary_file:
+            yield temporary_file
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+
+        if os.path.exists(path):
+            os.chmod(temporary_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(temporary_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_path)
+        raise
+
+
+def atomic_write(path: str, content: str):
+    """
+    Writes the content to the path through a temporary file & a rename, so an
+    interrupted write never leaves a partial file behind
+    """
+    with atomic_open(path) as temporary_file:
+        temporary_file.write(content)
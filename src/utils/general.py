@@ -7,7 +7,7 @@ import collections
 import random
 import string
 from itertools import islice
-from typing import Any, Callable, Iterable, Union
+from typing import Any, Callable, Dict, Iterable, List, Set, Union
 
 # Custom Modules
 from utils.unicode import BackgroundColor, ForeGroundColor, Format, Symbols
@@ -44,6 +44,31 @@ def consume(iterator: Iterable[Any], n: int = None) -> None:
         next(islice(iterator, n, n), None)
 
 
+def topological_waves(graph: Dict[str, Set[str]]) -> List[List[str]]:
+    """
+    Group the nodes of a dependency graph into waves, where every node only
+    depends on nodes of earlier waves. Nodes within a wave are independent of
+    each other, any nodes caught in a cycle are grouped into the final wave
+    """
+    remaining = {node: set(edges) & graph.keys()
+                 for node, edges in graph.items()}
+    waves = []
+
+    while remaining:
+        wave = sorted(node for node, edges in remaining.items() if not edges)
+
+        if not wave:
+            waves.append(sorted(remaining))
+            break
+
+        for node in wave:
+            remaining.pop(node)
+        for edges in remaining.values():
+            edges.difference_update(wave)
+        waves.append(wave)
+    return waves
+
+
 def random_string(n: int = 8) -> str:
     """
     Generate random string of length n
@@ -0,0 +1,153 @@
+"""
+Module holding helper methods for running external processes
+"""
+
+# Native Modules
+import collections
+import logging
+import os
+import signal
+import threading
+import time
+from subprocess import DEVNULL, PIPE, Popen, TimeoutExpired
+from typing import IO, List
+
+# Custom Modules
+from utils import fs
+from utils.general import format_ansi_string
+from utils.unicode import ForeGroundColor
+
+LOGGER = logging.getLogger()
+
+ProcessResult = collections.namedtuple('ProcessResult', ['returncode', 'out',
+                                                         'err'])
+
+ProcessEntry = collections.namedtuple('ProcessEntry', ['pid', 'uid', 'name'])
+
+TAIL_SIZE = 200
+PROGRESS_INTERVAL = 30
+
+
+def run_streamed(command: List[str], log_path: str) -> ProcessResult:
+    """
+    Runs the command & streams its stdout & stderr line by line into the log
+    file as it arrives. Only the last lines of each stream are kept in memory
+    for error reporting, while the progress of long running commands is
+    logged periodically
+    """
+    fs.makedirs(os.path.dirname(log_path) or '.')
+    label = os.path.splitext(os.path.basename(log_path))[0]
+
+    out_tail = collections.deque(maxlen=TAIL_SIZE)
+    err_tail = collections.deque(maxlen=TAIL_SIZE)
+    last_line = ['']
+    log_lock = threading.Lock()
+
+    with open(log_path, 'a') as log_file:
+        def forward(stream: IO[bytes], tail: collections.deque):
+            """
+            Forwards each line of the stream into the log file & the tail
+            """
+            for raw_line in iter(stream.readline, b''):
+                line = raw_line.decode('utf-8', errors='replace')
+                tail.append(line)
+                last_line[0] = line.strip() or last_line[0]
+
+                with log_lock:
+                    log_file.write(line)
+                    log_file.flush()
+            stream.close()
+
+        log_file.write(f'$ {" ".join(command)}\n')
+        log_file.flush()
+
+        with Popen(command, stdout=PIPE, stderr=PIPE) as process:
+            readers = [
+                threading.Thread(target=forward, args=(process.stdout,
+                                                       out_tail)),
+                threading.Thread(target=forward, args=(process.stderr,
+                                                       err_tail))
+            ]
+            for reader in readers:
+                reader.start()
+
+            start_time = time.time()
+            while True:
+                try:
+                    process.wait(timeout=PROGRESS_INTERVAL)
+                    break
+                except TimeoutExpired:
+                    elapsed = int(time.time() - start_time)
+                    LOGGER.info(format_ansi_string(
+                        f'{label} - still running ({elapsed}s) '
+                        f'{last_line[0][:80]}', ForeGroundColor.DARK_GREY))
+
+            for reader in readers:
+                reader.join()
+
+    return ProcessResult(process.returncode, ''.join(out_tail),
+                         ''.join(err_tail))
+
+
+def read_proc_entry(pid: int) -> ProcessEntry:
+    """
+    Reads the owner uid & executable name of the process from /proc, or
+    returns None if the process exited while the table was being scanned
+    """
+    try:
+        with open(f'/proc/{pid}/comm') as comm_file:
+            name = comm_file.read().strip()
+        with open(f'/proc/{pid}/status') as status_file:
+            uid_line = next(x for x in status_file if x.startswith('Uid:'))
+    except (OSError, StopIteration):
+        return None
+
+    return ProcessEntry(pid, int(uid_line.split()[1]), name)
+
+
+def list_processes() -> List[ProcessEntry]:
+    """
+    Lists the process table by scanning /proc directly, falling back to a
+    single ps call on hosts without /proc (e.g. macOS)
+    """
+    if os.path.isdir('/proc/self'):
+        entries = (read_proc_entry(int(x)) for x in os.listdir('/proc')
+                   if x.isdigit())
+        return [x for x in entries if x]
+
+    command = 'ps -axo pid=,uid=,comm='
+    with Popen(command.split(), stdout=PIPE, stderr=DEVNULL) as process:
+        out, _ = process.communicate()
+
+    entries = []
+    for line in out.decode('utf-8').splitlines():
+        fields = line.split(None, 2)
+        if len(fields) == 3 and fields[0].isdigit():
+            entries.append(ProcessEntry(int(fields[0]), int(fields[1]),
+                                        os.path.basename(fields[2].strip())))
+    return entries
+
+
+def find_processes(name: str, uid: int = None) -> List[ProcessEntry]:
+    """
+    Finds the processes of the executable owned by the uid, which defaults to
+    the current user
+    """
+    uid = os.getuid() if uid is None else uid
+    return [x for x in list_processes()
+            if x.name == name and x.uid == uid and x.pid != os.getpid()]
+
+
+def signal_processes(pids: List[int], sig: int = signal.SIGTERM) -> List[int]:
+    """
+    Sends the signal to each process without spawning kill, returning the
+    pids that were signalled. Processes that already exited are skipped
+    """
+    signalled = []
+    for pid in pids:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            continue
+        signalled.append(pid)
+    return signalled
@@ -0,0 +1,248 @@
+"""
+Module holding the models for editing ssh config & known_hosts files
+"""
+
+# Native Modules
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import re
+from typing import Iterable, List
+
+# Custom Modules
+from utils.fs import atomic_open, atomic_write
+
+OPTION_PATTERN = re.compile(r'^\s*(?P<key>\S+?)(?:\s*=\s*|\s+)(?P<value>.*?)'
+                            r'\s*$')
+BLOCK_KEYWORDS = ('host', 'match')
+HASHED_HOST_PREFIX = '|1|'
+DEFAULT_INDENT = '    '
+
+
+def parse_option(line: str) -> tuple:
+    """
+    Parses the lowercase keyword & value of a config line, or returns None for
+    blank lines & comments
+    """
+    stripped = line.strip()
+
+    if not stripped or stripped.startswith('#'):
+        return None
+
+    option_match = OPTION_PATTERN.match(stripped)
+    if not option_match:
+        return stripped.lower(), ''
+    return option_match['key'].lower(), option_match['value']
+
+
+class HostBlock:
+    """
+    Host or Match block of an ssh config file, keeping the raw lines so
+    comments & formatting survive edits
+    """
+
+    def __init__(self, header: str, lines: List[str] = None):
+        self.header = header
+        self.lines = lines or []
+
+    @property
+    def patterns(self) -> List[str]:
+        """
+        Returns the patterns the block applies to
+        """
+        return parse_option(self.header)[1].split()
+
+    def get(self, key: str) -> List[str]:
+        """
+        Returns every value of the option within the block
+        """
+        options = (parse_option(x) for x in self.lines)
+        return [x[1] for x in options if x and x[0] == key.lower()]
+
+    def set(self, key: str, value: str):
+        """
+        Sets the option to a single value, replacing any existing values
+        """
+        indices = [index for index, line in enumerate(self.lines)
+                   if (parse_option(line) or ('',))[0] == key.lower()]
+        indent = next((x[:len(x) - len(x.lstrip())] for x in self.lines
+                       if parse_option(x)), DEFAULT_INDENT)
+        line = f'{indent}{key} {value}'
+
+        if not indices:
+            self.lines.append(line)
+            return
+
+        self.lines[indices[0]] = line
+        self.lines = [x for index, x in enumerate(self.lines)
+                      if index not in indices[1:]]
+
+    def ensure(self, key: str, value: str) -> bool:
+        """
+        Appends the option with the value unless the block already holds it,
+        leaving any other values of the option untouched. Returns whether a
+        line was added
+        """
+        if value in self.get(key):
+            return False
+
+        indent = next((x[:len(x) - len(x.lstrip())] for x in self.lines
+                       if parse_option(x)), DEFAULT_INDENT)
+        self.lines.append(f'{indent}{key} {value}')
+        return True
+
+    def remove(self, key: str, value: str = None) -> int:
+        """
+        Removes every occurrence of the option, optionally only those with the
+        value, returning the number of removed lines
+        """
+        def matches(line: str) -> bool:
+            option = parse_option(line)
+            return bool(option) and option[0] == key.lower() and \
+                (value is None or option[1] == value)
+
+        kept = [x for x in self.lines if not matches(x)]
+        removed = len(self.lines) - len(kept)
+        self.lines = kept
+        return removed
+
+
+class SshConfig:
+    """
+    Parsed model of an ssh config file as the lines preceding the first block
+    & a list of Host/Match blocks, which is written back atomically
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.preamble = []
+        self.blocks = []
+
+        try:
+            with open(path) as config_file:
+                self.original = config_file.read()
+        except FileNotFoundError:
+            self.original = None
+
+        for line in (self.original or '').splitlines():
+            option = parse_option(line)
+
+            if option and option[0] in BLOCK_KEYWORDS:
+                self.blocks.append(HostBlock(line))
+            elif self.blocks:
+                self.blocks[-1].lines.append(line)
+            else:
+                self.preamble.append(line)
+
+    def find_block(self, pattern: str) -> HostBlock:
+        """
+        Returns the first Host block with exactly the pattern, if any
+        """
+        return next((x for x in self.blocks
+                     if parse_option(x.header)[0] == 'host' and
+                     x.patterns == [pattern]), None)
+
+    def add_block(self, pattern: str) -> HostBlock:
+        """
+        Appends a new Host block for the pattern
+        """
+        if self.blocks and self.blocks[-1].lines and \
+                self.blocks[-1].lines[-1].strip():
+            self.blocks[-1].lines.append('')
+        elif not self.blocks and self.preamble and self.preamble[-1].strip():
+            self.preamble.append('')
+
+        block = HostBlock(f'Host {pattern}')
+        self.blocks.append(block)
+        return block
+
+    def remove(self, key: str, value: str = None) -> int:
+        """
+        Removes every occurrence of the option across all blocks
+        """
+        return sum(x.remove(key, value) for x in self.blocks)
+
+    def render(self) -> str:
+        """
+        Renders the model back into the contents of the config file
+        """
+        lines = list(self.preamble)
+        for block in self.blocks:
+            lines.append(block.header)
+            lines.extend(block.lines)
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def save(self) -> bool:
+        """
+        Atomically writes the config file if its contents changed, returning
+        whether it was written
+        """
+        content = self.render()
+
+        if content == (self.original or ''):
+            return False
+
+        atomic_write(self.path, content)
+        self.original = content
+        return True
+
+
+def host_matches(entry: str, hosts: Iterable[str]) -> bool:
+    """
+    Check whether a known_hosts host entry, which is either a plain or hashed
+    hostname, refers to any of the hosts
+    """
+    if not entry.startswith(HASHED_HOST_PREFIX):
+        return entry in hosts
+
+    try:
+        salt, digest = entry[len(HASHED_HOST_PREFIX):].split('|', 1)
+        salt = base64.b64decode(salt)
+        digest = base64.b64decode(digest)
+    except (ValueError, binascii.Error):
+        return False
+
+    return any(hmac.compare_digest(
+        hmac.new(salt, x.encode('utf-8'), hashlib.sha1).digest(), digest)
+        for x in hosts)
+
+
+def known_host_matches(line: str, hosts: Iterable[str]) -> bool:
+    """
+    Check whether a known_hosts line holds a key for any of the hosts
+    """
+    fields = line.split()
+
+    if fields and fields[0].startswith('@'):
+        fields = fields[1:]
+    if not fields or fields[0].startswith('#'):
+        return False
+
+    return any(host_matches(x, hosts) for x in fields[0].split(','))
+
+
+def filter_known_hosts(path: str, hosts: Iterable[str]) -> int:
+    """
+    Removes every known_hosts line of the hosts, including hashed ones, by
+    streaming the file line by line into a temporary file that atomically
+    replaces it. Returns the number of removed lines
+    """
+    hosts = set(hosts)
+
+    if not os.path.exists(path):
+        return 0
+
+    with open(path) as known_hosts:
+        if not any(known_host_matches(x, hosts) for x in known_hosts):
+            return 0
+
+    removed = 0
+    with open(path) as known_hosts, atomic_open(path) as filtered:
+        for line in known_hosts:
+            if known_host_matches(line, hosts):
+                removed += 1
+            else:
+                filtered.write(line)
+    return removed